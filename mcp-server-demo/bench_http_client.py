@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+import http_client
+
+def start_stub_upstream(port, handshake_delay, response_delay, body_size):
+    """
+    Local upstream that waits handshake_delay seconds on every new connection (standing in
+    for the TCP and TLS round trips to a remote host) and response_delay on every request.
+    Returns the server and a dict counting the connections it accepted.
+    """
+    body = b"x" * body_size
+    counts = {"connections": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep connections open between requests
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out as separate writes; without this Nagle's algorithm delays the body
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with lock:
+                counts["connections"] += 1
+            time.sleep(handshake_delay)
+
+        def do_GET(self):
+            time.sleep(response_delay)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counts
+
+def report(name, latencies, seconds, connections):
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"{name:<38} {p50:>9.2f} {p95:>9.2f} {len(latencies) / seconds:>10,.1f} {connections:>12}")
+
+def run_sync(name, fetch, url, n_requests, counts):
+    before = counts["connections"]
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        call_start = time.perf_counter()
+        fetch(url).raise_for_status()
+        latencies.append((time.perf_counter() - call_start) * 1000)
+    report(name, latencies, time.perf_counter() - start, counts["connections"] - before)
+
+async def run_async(name, fetch, url, n_requests, concurrency, counts):
+    before = counts["connections"]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            call_start = time.perf_counter()
+            (await fetch(url)).raise_for_status()
+            latencies.append((time.perf_counter() - call_start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    report(name, latencies, time.perf_counter() - start, counts["connections"] - before)
+
+async def new_client_get(url):
+    async with httpx.AsyncClient() as client:
+        return await client.get(url)
+
+async def run_async_comparison(url, n_requests, concurrency, counts):
+    await run_async(f"new connection per call (x{concurrency})", new_client_get, url, n_requests, concurrency, counts)
+    await run_async(f"shared pooled client (x{concurrency})", lambda u: http_client.arequest("GET", u),
+                    url, n_requests, concurrency, counts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call connections with the shared pooled HTTP client.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight for the async comparison.")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="Simulated connection setup time.")
+    parser.add_argument("--response-ms", type=float, default=5.0, help="Simulated upstream processing time.")
+    parser.add_argument("--body-bytes", type=int, default=20_000)
+    parser.add_argument("--port", type=int, default=8095)
+    args = parser.parse_args()
+
+    server, counts = start_stub_upstream(args.port, args.handshake_ms / 1000, args.response_ms / 1000, args.body_bytes)
+    url = f"http://127.0.0.1:{args.port}/feed"
+    try:
+        print(f"{args.requests} requests, {args.handshake_ms:.0f} ms connection setup, "
+              f"{args.response_ms:.0f} ms response time\n")
+        print(f"{'client':<38} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>10} {'connections':>12}")
+        run_sync("new connection per call", httpx.get, url, args.requests, counts)
+        run_sync("shared pooled client", lambda u: http_client.request("GET", u), url, args.requests, counts)
+        asyncio.run(run_async_comparison(url, args.requests, args.concurrency, counts))
+        print(f"\nShared client metrics: {http_client.metrics.stats}")
+    finally:
+        server.shutdown()
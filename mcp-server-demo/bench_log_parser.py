@@ -0,0 +1,144 @@
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from log_parser import parse_log
+
+def make_log(n_lines, seed=0):
+    """
+    Synthetic access log, one line per second: mostly tracking requests with coordinates,
+    mixed with other requests and unparseable lines.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 6)
+    lines = []
+    for i in range(n_lines):
+        timestamp = (start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+        ip = f"10.0.{rng.randrange(256)}.{rng.randrange(256)}"
+        kind = rng.random()
+        if kind < 0.78:
+            lines.append(f"{timestamp} - {ip} GET /track?user={rng.randrange(10_000)}"
+                         f"&lng={rng.uniform(0, 180):.6f}&lat={rng.uniform(0, 90):.6f} HTTP/1.1 200")
+        elif kind < 0.8:
+            # A junk lng= after the coordinates; the pair before it is the match
+            lines.append(f"{timestamp} - {ip} GET /track?lng={rng.uniform(0, 180):.6f}"
+                         f"&lat={rng.uniform(0, 90):.6f}&ref=/map?lng=none HTTP/1.1 200")
+        elif kind < 0.9:
+            lines.append(f"{timestamp} - {ip} POST /api/session HTTP/1.1 201")
+        elif kind < 0.97:
+            lines.append(f"{timestamp} - {ip} GET /static/app.js HTTP/1.1 304")
+        else:
+            lines.append(f"WARN worker {rng.randrange(8)} restarted")
+    return ("\n".join(lines) + "\n").encode()
+
+def parse_log_regex(log_text):
+    """
+    The previous implementation: one backtracking findall over the whole text, string columns.
+    """
+    log_pattern = r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - .*GET .*lng=(?P<lng>[\d.]+)&lat=(?P<lat>[\d.]+)"
+    matches = re.findall(log_pattern, log_text)
+    return pd.DataFrame(matches, columns=["timestamp", "lng", "lat"])
+
+# Lines where a parser could pick the wrong lng=/lat= pair, or none
+EDGE_CASES = [
+    "2024-05-06 10:00:00 - 10.0.0.1 GET /track?lng=1.5&lat=2.5 HTTP/1.1 200",
+    "2024-05-06 10:00:01 - 10.0.0.1 GET /track?lng=1.5&lat=2.5&next=/map?lng=abc HTTP/1.1 200",
+    "2024-05-06 10:00:02 - 10.0.0.1 GET /track?lng=1.5&lat=2.5&next=/map?lng=3.5&lat=4.5 HTTP/1.1 200",
+    "2024-05-06 10:00:03 - 10.0.0.1 GET /track?lng=1.5&lat=2.5&lng=3.5&lat=x HTTP/1.1 200",
+    "2024-05-06 10:00:04 - 10.0.0.1 GET /track?lng=1.5&lat=2.5&lng=3.5 HTTP/1.1 200",
+    "2024-05-06 10:00:05 - 10.0.0.1 lng=1.5&lat=2.5 GET /track HTTP/1.1 200",
+    "2024-05-06 10:00:06 - 10.0.0.1 GET /track?lng=&lat=2.5 HTTP/1.1 200",
+    "2024-05-06 10:00:07 - 10.0.0.1 GET /track?lng=1.5&lat= HTTP/1.1 200",
+    "2024-05-06 10:00:08 - 10.0.0.1 POST /track?lng=1.5&lat=2.5 GET lng=6.5&lat=7.5&lng=junk",
+    "WARN lng=1.5&lat=2.5 GET lng=1.5&lat=2.5",
+    "2024-05-06 10:00:09 - 10.0.0.1 GET /track?lng=1.5&lat=4- HTTP/1.1 200",
+    "2024-05-06 10:00:10 - 10.0.0.1 GET /track?lng=1.5&lat=4.-x HTTP/1.1 200",
+    "2024-05-06 10:00:11 - 10.0.0.1 GET /track?lng=1.5&lat=2.5&lng=3.5-&lat=4.5 HTTP/1.1 200",
+]
+
+# Values the regex cannot read (negative, or a run with a stray dot): the streaming parser
+# takes the longest numeric prefix of the run
+NUMBER_CASES = [
+    ("2024-05-06 10:00:00 - 10.0.0.1 GET /track?lng=-1.5&lat=-2.5 HTTP/1.1 200", -1.5, -2.5),
+    ("2024-05-06 10:00:01 - 10.0.0.1 GET /track?lng=1.5&lat=2.5.1 HTTP/1.1 200", 1.5, 2.5),
+    ("2024-05-06 10:00:02 - 10.0.0.1 GET /track?lng=1.5.&lat=.5 HTTP/1.1 200", 1.5, 0.5),
+    ("2024-05-06 10:00:03 - 10.0.0.1 GET /track?lng=1-5&lat=2 HTTP/1.1 200", None, None),
+    ("2024-05-06 10:00:04 - 10.0.0.1 GET /track?lng=-&lat=2 HTTP/1.1 200", None, None),
+]
+
+def check_same_rows(result, expected):
+    """
+    Assert that the streaming parser's typed rows equal the regex parser's string rows.
+    """
+    assert np.array_equal(result["timestamp"].to_numpy(),
+                          pd.to_datetime(expected["timestamp"]).to_numpy("datetime64[s]"))
+    assert np.array_equal(result["lng"].to_numpy(), expected["lng"].astype(float).to_numpy())
+    assert np.array_equal(result["lat"].to_numpy(), expected["lat"].astype(float).to_numpy())
+
+def check_edge_cases():
+    """
+    The streaming parser must pick the same lng/lat pair per line as the regex parser.
+    """
+    text = "\n".join(EDGE_CASES) + "\n"
+    check_same_rows(parse_log(text), parse_log_regex(text))
+    for line, lng, lat in NUMBER_CASES:
+        result = parse_log(line + "\n")
+        expected = [] if lng is None else [(lng, lat)]
+        assert list(zip(result["lng"], result["lat"])) == expected, line
+
+def measure(parse, data, repeats):
+    """
+    Best wall time over repeats (s) and the peak memory allocated by one parse (MB),
+    not counting the input log.
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = parse(data)
+        seconds.append(time.perf_counter() - start)
+    del result
+    tracemalloc.start()
+    result = parse(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(seconds), peak / 2 ** 20, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the streaming travel log parser with the regex parser.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000], help="Log sizes to test.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    check_edge_cases()
+    print(f"{len(EDGE_CASES)} edge-case lines parsed the same as the regex parser.\n")
+    print(f"{'lines':>10} {'log MB':>7} {'parser':<26} {'s':>7} {'MB/s':>7} {'lines/s':>12} {'peak MB':>8} "
+          f"{'rows':>9}")
+    for n_lines in args.lines:
+        data = make_log(n_lines)
+        text = data.decode()
+        # A one-hour window in the middle of the log
+        middle = datetime(2024, 5, 6) + timedelta(seconds=n_lines // 2)
+        window = (middle.isoformat(), (middle + timedelta(hours=1)).isoformat())
+        cases = [
+            ("regex (previous)", parse_log_regex, text),
+            ("streaming", parse_log, data),
+            ("streaming, 1 hour window", lambda log: parse_log(log, *window), data),
+        ]
+        expected = None
+        for name, parse, log in cases:
+            seconds, peak_mb, result = measure(parse, log, args.repeats)
+            if expected is None:
+                expected = result
+            elif name == "streaming":
+                # Same rows as the regex parser, now typed
+                check_same_rows(result, expected)
+            print(f"{n_lines:>10,} {len(data) / 2 ** 20:>7.1f} {name:<26} {seconds:>7.3f} "
+                  f"{len(data) / 2 ** 20 / seconds:>7.1f} {n_lines / seconds:>12,.0f} {peak_mb:>8.1f} {len(result):>9,}")
+        print()
+    print("peak MB excludes the log text itself; the streaming parser keeps only typed columns.")
@@ -0,0 +1,85 @@
+import argparse
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from rss_parser import parse_rss
+
+def make_feed(n_items, description_words=60):
+    """
+    Synthetic RSS 2.0 feed with n_items items, newest first, one hour apart.
+    """
+    newest = datetime(2024, 5, 6, 10, tzinfo=timezone.utc)
+    words = " ".join(f"word{i}" for i in range(description_words))
+    items = "".join(
+        f"<item><title>Item {i}</title><link>https://example.com/items/{i}</link>"
+        f"<guid>https://example.com/items/{i}</guid><category>news</category>"
+        f"<description>Item {i}: {words}</description>"
+        f"<pubDate>{format_datetime(newest - timedelta(hours=i))}</pubDate></item>"
+        for i in range(n_items)
+    )
+    return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>Synthetic</title>'
+            f'<link>https://example.com</link>{items}</channel></rss>').encode()
+
+def parse_rss_tree(xml_data):
+    """
+    The previous implementation: build the whole tree, then look every field up twice.
+    """
+    root = ET.fromstring(xml_data)
+    feed_data = []
+    for item in root.findall(".//item"):
+        title = item.find("title").text if item.find("title") is not None else None
+        link = item.find("link").text if item.find("link") is not None else None
+        description = item.find("description").text if item.find("description") is not None else None
+        pub_date = item.find("pubDate").text if item.find("pubDate") is not None else None
+        feed_data.append({"Title": title, "Link": link, "Description": description, "Publication Date": pub_date})
+    return feed_data
+
+def measure(parse, xml_data, repeats):
+    """
+    Best wall time over repeats (ms) and the peak memory allocated by one parse (MB),
+    not counting the input document.
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = parse(xml_data)
+        seconds.append(time.perf_counter() - start)
+    del result
+    tracemalloc.start()
+    result = parse(xml_data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(seconds) * 1000, peak / 2 ** 20, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the streaming RSS parser with the tree-based parser.")
+    parser.add_argument("--items", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Feed sizes to test.")
+    parser.add_argument("--limit", type=int, default=20, help="Items requested in the early-stop case.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'feed MB':>8} {'parser':<24} {'ms':>9} {'items/s':>12} {'peak MB':>9} {'returned':>9}")
+    for n_items in args.items:
+        xml_data = make_feed(n_items)
+        # Items from the newest tenth of the feed
+        since = datetime(2024, 5, 6, 10, tzinfo=timezone.utc) - timedelta(hours=n_items // 10)
+        cases = [
+            ("tree (previous)", parse_rss_tree),
+            ("streaming", parse_rss),
+            (f"streaming, limit={args.limit}", lambda data: parse_rss(data, limit=args.limit)),
+            ("streaming, newest 10%", lambda data: parse_rss(data, since=since)),
+        ]
+        expected = None
+        for name, parse in cases:
+            ms, peak_mb, result = measure(parse, xml_data, args.repeats)
+            if expected is None:
+                expected = result
+            elif result != expected[:len(result)]:
+                raise SystemExit(f"{name} returned different items than the tree parser")
+            print(f"{n_items:>8,} {len(xml_data) / 2 ** 20:>8.1f} {name:<24} {ms:>9.1f} "
+                  f"{n_items / (ms / 1000):>12,.0f} {peak_mb:>9.1f} {len(result):>9,}")
+        print()
+    print("items/s is feed items per second of parsing; peak MB excludes the downloaded document.")
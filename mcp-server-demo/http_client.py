@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, deque
+
+import httpx
+import numpy as np
+
+# Upstream HTTP client configuration, shared by every tool in the server
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))  # Open connections across all hosts
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))  # Idle connections kept open
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection is kept
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))  # Connect, read, write and pool timeout
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))  # Extra attempts after a failed request
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))  # Seconds, doubled on every attempt
+HTTP_RETRY_STATUSES = {int(status) for status in os.getenv("HTTP_RETRY_STATUSES", "429,502,503,504").split(",")}
+HTTP_METRICS_WINDOW = int(os.getenv("HTTP_METRICS_WINDOW", "1000"))  # Recent requests kept for percentiles
+
+# Methods that are safe to send again after a response or a dropped connection
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class HttpMetrics:
+    """
+    Counters for upstream requests. New connections are counted from httpcore trace events,
+    so every request that did not open one reused a pooled connection.
+    """
+
+    def __init__(self, window=HTTP_METRICS_WINDOW):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.retries = 0
+        self.errors = 0
+        self.http_versions = Counter()  # Completed requests per negotiated protocol, e.g. "HTTP/2"
+        self.latencies = deque(maxlen=window)  # Milliseconds per attempt
+        self._lock = threading.Lock()
+
+    def trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event, info):
+        self.trace(event, info)
+
+    def record(self, seconds, response=None, retried=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retried
+            if response is None:
+                self.errors += 1
+            else:
+                self.http_versions[response.http_version] += 1
+            self.latencies.append(seconds * 1000)
+
+    @property
+    def stats(self):
+        with self._lock:
+            completed = self.requests - self.errors
+            reused = max(0, completed - self.connections_opened)
+            stats = {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_rate": round(reused / completed, 4) if completed else 0.0,
+                "tls_handshakes": self.tls_handshakes,
+                "requests_by_http_version": dict(self.http_versions),
+                "retries": self.retries,
+                "errors": self.errors,
+            }
+            latencies = np.array(self.latencies)
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats["latency"] = {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+                                "p99_ms": round(float(p99), 2)}
+        return stats
+
+metrics = HttpMetrics()
+
+def client_options():
+    return {
+        "limits": httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                               max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                               keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+        "http2": True,  # Negotiated per upstream via ALPN; plain-HTTP hosts stay on HTTP/1.1
+        "follow_redirects": True,
+    }
+
+def retry_delay(attempt, response=None):
+    """
+    Exponential backoff, or the upstream's Retry-After (in seconds) when it sends one.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return HTTP_RETRY_BACKOFF * 2 ** attempt
+
+def should_retry(method, attempt, retries, response=None, error=None):
+    if attempt >= retries:
+        return False
+    if error is not None:
+        # A request that never reached the upstream can always be sent again
+        return isinstance(error, httpx.ConnectError) or method in IDEMPOTENT_METHODS
+    return method in IDEMPOTENT_METHODS and response.status_code in HTTP_RETRY_STATUSES
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return the process-wide synchronous client, whose connections are pooled and kept alive.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(**client_options())
+        return _client
+
+def get_async_client():
+    """
+    Return the process-wide async client, whose connections are pooled and kept alive.
+    """
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(**client_options())
+        return _async_client
+
+def request(method, url, retries=HTTP_RETRIES, stream=False, **kwargs):
+    """
+    Send a request through the shared client, retrying connection failures and (for
+    idempotent methods) retryable statuses with backoff. Returns the last response, or
+    raises the last httpx.HTTPError.
+
+    With stream=True the body is not read: iterate it with response.iter_bytes() and
+    release the connection with response.close().
+    """
+    method = method.upper()
+    client = get_client()
+    send_options = {key: kwargs.pop(key) for key in ("auth", "follow_redirects") if key in kwargs}
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            response = client.send(client.build_request(method, url, extensions={"trace": metrics.trace}, **kwargs),
+                                   stream=stream, **send_options)
+        except httpx.HTTPError as e:
+            metrics.record(time.perf_counter() - start, retried=attempt > 0)
+            if not should_retry(method, attempt, retries, error=e):
+                raise
+            time.sleep(retry_delay(attempt))
+            continue
+        metrics.record(time.perf_counter() - start, response, retried=attempt > 0)
+        if not should_retry(method, attempt, retries, response=response):
+            return response
+        response.close()
+        time.sleep(retry_delay(attempt, response))
+
+async def arequest(method, url, retries=HTTP_RETRIES, stream=False, **kwargs):
+    """
+    Async request: the same retry policy, through the shared async client. With
+    stream=True iterate the body with response.aiter_bytes() and finish with response.aclose().
+    """
+    method = method.upper()
+    client = get_async_client()
+    send_options = {key: kwargs.pop(key) for key in ("auth", "follow_redirects") if key in kwargs}
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            response = await client.send(
+                client.build_request(method, url, extensions={"trace": metrics.atrace}, **kwargs),
+                stream=stream, **send_options
+            )
+        except httpx.HTTPError as e:
+            metrics.record(time.perf_counter() - start, retried=attempt > 0)
+            if not should_retry(method, attempt, retries, error=e):
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+        metrics.record(time.perf_counter() - start, response, retried=attempt > 0)
+        if not should_retry(method, attempt, retries, response=response):
+            return response
+        await response.aclose()
+        await asyncio.sleep(retry_delay(attempt, response))
@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from fastmcp import Client
+
+def make_rss(n_items):
+    items = "".join(
+        f"<item><title>Item {i}</title><link>https://example.com/{i}</link>"
+        f"<description>Description of item {i}</description><pubDate>Mon, 06 May 2024 10:00:00 GMT</pubDate></item>"
+        for i in range(n_items)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Stub</title>{items}</channel></rss>'.encode()
+
+def make_log(n_lines):
+    return "".join(
+        f"2024-05-06 10:{i // 60 % 60:02d}:{i % 60:02d} - 10.0.0.1 GET /track?lng={100 + i % 50}.5&lat={10 + i % 30}.25\n"
+        for i in range(n_lines)
+    ).encode()
+
+def start_stub_upstream(port, delay, n_items):
+    """
+    Serve a fixed RSS feed at /rss and a travel log at /logs, answering every request after
+    delay seconds, like a slow remote upstream. Responses carry an ETag, and a matching
+    If-None-Match is answered with 304 Not Modified.
+    """
+    bodies = {"/rss": make_rss(n_items), "/logs": make_log(n_items)}
+    etag = '"stub-v1"'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = bodies.get(self.path)
+            if body and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200 if body else 404)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def wait_for_server(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with Client(url) as client:
+                await client.list_tools()
+                return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+async def run_clients(url, tool, arguments, n_clients, calls_per_client):
+    """
+    Open n_clients MCP sessions that each call the tool calls_per_client times in sequence.
+    Returns per-call latencies (ms), the wall-clock time (s) and the number of failed calls.
+    """
+    latencies, errors = [], 0
+
+    async def client_loop():
+        nonlocal errors
+        async with Client(url) as client:
+            for _ in range(calls_per_client):
+                start = time.perf_counter()
+                try:
+                    await client.call_tool(tool, arguments)
+                except Exception:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(n_clients)))
+    return np.array(latencies), time.perf_counter() - start, errors
+
+async def main(args):
+    server, upstream = None, None
+    if args.server_url:
+        url = args.server_url
+    else:
+        upstream = start_stub_upstream(args.upstream_port, args.upstream_delay, args.items)
+        env = {
+            **os.environ,
+            "MCP_PORT": str(args.port),
+            "RSS_FEED_URL": f"http://127.0.0.1:{args.upstream_port}/rss",
+            "TRAVEL_LOCATIONS_URL": f"http://127.0.0.1:{args.upstream_port}/logs",
+        }
+        server = subprocess.Popen([sys.executable, "server_rag.py"], env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{args.port}/mcp"
+    try:
+        await wait_for_server(url)
+        arguments = json.loads(args.arguments)
+        print(f"Tool {args.tool} at {url}, {args.calls} calls per client"
+              + ("" if args.server_url else f", stub upstream delay {args.upstream_delay * 1000:.0f} ms") + "\n")
+        print(f"{'clients':>8} {'calls/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        results = []
+        for n_clients in args.clients:
+            latencies, seconds, errors = await run_clients(url, args.tool, arguments, n_clients, args.calls)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            row = {"clients": n_clients, "calls_per_second": round(len(latencies) / seconds, 1),
+                   "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+                   "errors": errors}
+            print(f"{n_clients:>8} {row['calls_per_second']:>10,.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                  f"{row['p99_ms']:>9.1f} {errors:>7}")
+            results.append(row)
+        with open(args.output, "w") as f:
+            json.dump({"tool": args.tool, "calls_per_client": args.calls, "results": results}, f, indent=2)
+        print(f"\nWith non-blocking tools, throughput should grow with the number of clients until the\n"
+              f"upstream or the CPU saturates. Report written to {args.output}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if upstream is not None:
+            upstream.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency load test for the MCP server's tools.")
+    parser.add_argument("--tool", default="get_travel_locations")
+    parser.add_argument("--arguments", default="{}", help="Tool arguments as JSON.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64], help="Concurrent sessions to test.")
+    parser.add_argument("--calls", type=int, default=10, help="Sequential calls per client.")
+    parser.add_argument("--server-url", help="Load an already running server instead of starting one.")
+    parser.add_argument("--port", type=int, default=8091, help="Port for the server started by the test.")
+    parser.add_argument("--upstream-port", type=int, default=8092, help="Port for the stub upstream.")
+    parser.add_argument("--upstream-delay", type=float, default=0.2, help="Stub upstream response time (s).")
+    parser.add_argument("--items", type=int, default=200, help="RSS items and log lines served by the stub.")
+    parser.add_argument("--output", default="load_test_report.json")
+    asyncio.run(main(parser.parse_args()))
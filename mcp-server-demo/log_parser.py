@@ -0,0 +1,243 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from http_client import arequest
+
+# Travel log parsing configuration
+LOG_CHUNK_BYTES = int(os.getenv("LOG_CHUNK_BYTES", str(1 << 20)))  # Bytes of the log parsed at a time
+LOG_CHRONOLOGICAL = os.getenv("LOG_CHRONOLOGICAL", "true").lower() == "true"  # Skip/stop on chunks outside the window
+LOG_NUMBER_WIDTH = 24  # Longest lng/lat value read, in characters
+
+# Every matching line starts with "YYYY-MM-DD HH:MM:SS - "
+LINE_PREFIX = b"0000-00-00 00:00:00 - "
+TIMESTAMP_WIDTH = 19
+PREFIX_DIGITS = np.array([i for i, char in enumerate(LINE_PREFIX) if char == ord("0")])
+PREFIX_LITERALS = np.array([i for i, char in enumerate(LINE_PREFIX) if char != ord("0")])
+PREFIX_LITERAL_BYTES = np.frombuffer(LINE_PREFIX, np.uint8)[PREFIX_LITERALS]
+LAT_TAG = np.frombuffer(b"&lat=", np.uint8)
+
+def parse_time_bound(value):
+    """
+    Parse an ISO 8601 window bound ("2024-05-06", "2024-05-06T10:00:00") into a
+    datetime64[s]. Aware values are converted to UTC; log timestamps carry no zone.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[s]")
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "s")
+
+def find_all(buffer, needle):
+    """
+    Positions of every occurrence of needle in a uint8 array.
+    """
+    positions = np.flatnonzero(buffer[:len(buffer) - len(needle) + 1] == needle[0])
+    for offset in range(1, len(needle)):
+        positions = positions[buffer[positions + offset] == needle[offset]]
+    return positions
+
+def read_timestamps(text):
+    """
+    Convert rows of "YYYY-MM-DD HH:MM:SS" bytes to datetime64[s] (NaT for impossible dates).
+    """
+    text = text.copy().view(f"S{TIMESTAMP_WIDTH}").ravel()
+    try:
+        return text.astype("datetime64[s]")
+    except ValueError:
+        return pd.to_datetime(pd.Series(text).str.decode("ascii"), format="%Y-%m-%d %H:%M:%S",
+                              errors="coerce").to_numpy("datetime64[s]")
+
+def read_numbers(windows, positions):
+    """
+    Read the run of number characters (digits and dots, after an optional leading "-")
+    starting at each position. The value is the longest numeric prefix of the run, up to
+    its second dot, so "4-" reads 4 and "2.5.1" reads 2.5.
+    Returns the values (NaN where the run has no digits or is overlong) and the length
+    of each run.
+    """
+    text = windows[positions]
+    columns = np.arange(LOG_NUMBER_WIDTH)
+    rows = np.arange(len(text))
+    digits = (text - ord("0")) < 10  # uint8 arithmetic wraps, so only "0"-"9" are below 10
+    dots = text == ord(".")
+    valid = digits | dots
+    valid[:, 0] |= text[:, 0] == ord("-")
+    lengths = np.where(valid.all(axis=1), LOG_NUMBER_WIDTH, valid.argmin(axis=1))
+    # The numeric prefix ends at the run's second dot
+    dots &= columns < lengths[:, None]
+    dots[rows, dots.argmax(axis=1)] = False
+    second = dots.argmax(axis=1)
+    prefix = np.where(dots[rows, second], second, lengths)
+    outside = columns >= prefix[:, None]
+    text[outside] = 0
+    digits &= ~outside
+    missing = ~digits.any(axis=1) | (lengths == LOG_NUMBER_WIDTH)
+    # Every prefix left is a float literal; "0" stands in for the rows set to NaN below
+    text[missing, 0] = ord("0")
+    text[missing, 1:] = 0
+    values = text.view(f"S{LOG_NUMBER_WIDTH}").ravel().astype(np.float64)
+    values[missing] = np.nan
+    return values, lengths
+
+def parse_lines(block, start=None, end=None):
+    """
+    Parse a block of complete log lines (bytes ending in a newline) without a Python loop
+    over the lines. A line matches when it starts with a "YYYY-MM-DD HH:MM:SS - "
+    timestamp and later has "GET " followed by "lng=<number>&lat=<number>". Like the
+    previous regex, the last such pair on the line is used; a later lng= that is not
+    followed by numbers is ignored. Lines with timestamps outside [start, end) are skipped.
+
+    Returns the timestamps (datetime64[s]), longitudes and latitudes (float64) of the matches.
+    """
+    size = len(block)
+    # Padding lets every fixed-width read near the end stay inside the buffer
+    buffer = np.frombuffer(block + bytes(2 * LOG_NUMBER_WIDTH + len(LINE_PREFIX)), np.uint8)
+    line_ends = np.flatnonzero(buffer[:size] == ord("\n"))
+    line_starts = np.concatenate([[0], line_ends[:-1] + 1])
+
+    # Fast prefix check on every line at once
+    prefix = sliding_window_view(buffer, len(LINE_PREFIX))[line_starts]
+    matched = ((line_ends - line_starts >= len(LINE_PREFIX))
+               & ((prefix[:, PREFIX_DIGITS] - ord("0")) < 10).all(axis=1)
+               & (prefix[:, PREFIX_LITERALS] == PREFIX_LITERAL_BYTES).all(axis=1))
+    timestamps = np.full(len(line_starts), np.datetime64("NaT"), dtype="datetime64[s]")
+    timestamps[matched] = read_timestamps(prefix[matched, :TIMESTAMP_WIDTH])
+    matched &= ~np.isnat(timestamps)
+    if start is not None:
+        matched &= timestamps >= start
+    if end is not None:
+        matched &= timestamps < end
+    # Skipped lines get an empty body, so nothing found in them is used
+    body_starts = np.where(matched, line_starts + len(LINE_PREFIX), line_ends)
+
+    lng = find_all(buffer[:size], b"lng=")
+    line = np.searchsorted(line_ends, lng)
+    keep = lng >= body_starts[line]
+    lng, line = lng[keep], line[keep]
+
+    get = find_all(buffer[:size], b"GET ")
+    get_line = np.searchsorted(line_ends, get)
+    keep = get >= body_starts[get_line]
+    first_get = np.full(len(line_ends), size)
+    first_get[get_line[keep][::-1]] = get[keep][::-1]  # Reversed, so the first GET of each line is written last
+    keep = first_get[line] + len(b"GET ") <= lng
+    lng, line = lng[keep], line[keep]
+
+    # Read every lng=...&lat=... candidate, then keep the last valid one of each line
+    windows = sliding_window_view(buffer, LOG_NUMBER_WIDTH)
+    lng_values, lng_lengths = read_numbers(windows, lng + len(b"lng="))
+    lat_tag = lng + len(b"lng=") + lng_lengths
+    keep = (sliding_window_view(buffer, len(LAT_TAG))[lat_tag] == LAT_TAG).all(axis=1)
+    lat_values, _ = read_numbers(windows, lat_tag + len(LAT_TAG))
+    keep &= ~np.isnan(lng_values) & ~np.isnan(lat_values)
+    line, lng_values, lat_values = line[keep], lng_values[keep], lat_values[keep]
+    last = np.ones(len(line), dtype=bool)
+    last[:-1] = line[1:] != line[:-1]
+    return timestamps[line[last]], lng_values[last], lat_values[last]
+
+def line_timestamp(block, position):
+    """
+    The timestamp at the start of the line at position, or None if it has none.
+    """
+    try:
+        return np.datetime64(block[position:position + TIMESTAMP_WIDTH].decode("ascii"), "s")
+    except ValueError:
+        return None
+
+class TravelLogParser:
+    """
+    Incremental travel log parser: feed() it the log in chunks of any size and close()
+    it for a DataFrame with typed columns. Only the parsed values are kept, never the
+    log text. Lines outside the [start, end) window are dropped during the parse.
+
+    For chronological logs a chunk whose last line is before start is skipped without
+    parsing, and the parser is done (ignores the rest) at the first chunk starting at or
+    after end.
+    """
+
+    def __init__(self, start=None, end=None, chronological=LOG_CHRONOLOGICAL):
+        self.start = parse_time_bound(start)
+        self.end = parse_time_bound(end)
+        self.chronological = chronological
+        self.done = False
+        self._rest = b""
+        self._columns = []
+
+    def split(self, data):
+        """
+        Add data and return the block of complete lines ready to parse (b"" if none).
+        """
+        if self.done:
+            return b""
+        data = self._rest + data
+        cut = data.rfind(b"\n") + 1
+        self._rest = data[cut:]
+        return data[:cut]
+
+    def parse(self, block):
+        if not block or self.done:
+            return
+        if self.chronological:
+            if self.end is not None and (first := line_timestamp(block, 0)) is not None and first >= self.end:
+                self.done = True
+                return
+            last_start = block.rfind(b"\n", 0, len(block) - 1) + 1
+            if self.start is not None and (last := line_timestamp(block, last_start)) is not None and last < self.start:
+                return
+        self._columns.append(parse_lines(block, self.start, self.end))
+
+    def feed(self, data):
+        self.parse(self.split(data))
+
+    def close(self):
+        """
+        Parse what is left and return a DataFrame with columns timestamp (datetime64),
+        lng and lat (float64).
+        """
+        if self._rest:
+            self.parse(self._rest + b"\n")
+            self._rest = b""
+        if self._columns:
+            timestamps, lngs, lats = (np.concatenate(column) for column in zip(*self._columns))
+        else:
+            timestamps, lngs, lats = np.array([], "datetime64[s]"), np.array([]), np.array([])
+        return pd.DataFrame({"timestamp": timestamps, "lng": lngs, "lat": lats})
+
+def parse_log(log_text, start=None, end=None):
+    """
+    Parse complete log text (str or bytes) into a DataFrame of timestamp, lng and lat.
+    """
+    if isinstance(log_text, str):
+        log_text = log_text.encode()
+    parser = TravelLogParser(start, end)
+    for offset in range(0, len(log_text), LOG_CHUNK_BYTES):
+        parser.feed(log_text[offset:offset + LOG_CHUNK_BYTES])
+        if parser.done:
+            break
+    return parser.close()
+
+async def afetch_travel_log(url, start=None, end=None):
+    """
+    Download and parse a travel log chunk by chunk, parsing each chunk in a worker thread.
+    For chronological logs the download stops once the window has been passed.
+    """
+    parser = TravelLogParser(start, end)
+    response = await arequest("GET", url, stream=True)
+    try:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(LOG_CHUNK_BYTES):
+            await asyncio.to_thread(parser.parse, parser.split(chunk))
+            if parser.done:
+                break
+    finally:
+        await response.aclose()
+    return await asyncio.to_thread(parser.close)
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+
+from http_client import arequest
+
+# Upstream response cache configuration
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))  # Seconds a parsed response is served without asking
+RESPONSE_CACHE_MAX_STALE = float(os.getenv("RESPONSE_CACHE_MAX_STALE", "86400"))  # Seconds stale data may cover an outage
+
+class ResponseCache:
+    """
+    In-memory cache of parsed GET responses. Within ttl seconds of the last check a call
+    returns the parsed result without touching the upstream. After that the entry is
+    revalidated with a conditional GET (If-None-Match / If-Modified-Since), so an unchanged
+    resource costs a 304 and no parsing. Concurrent calls for the same URL share a single
+    upstream request.
+
+    Results are shared between callers and must not be modified.
+
+    parse turns the response bytes into the cached value and runs in a worker thread.
+    With incremental=True, parse() instead returns a parser whose feed(chunk) is called
+    as the body streams in and whose close() returns the value, so the whole body is
+    never held in memory.
+    """
+
+    def __init__(self, parse, ttl=RESPONSE_CACHE_TTL, max_stale=RESPONSE_CACHE_MAX_STALE, incremental=False,
+                 chunk_bytes=65536):
+        self.parse = parse
+        self.incremental = incremental
+        self.chunk_bytes = chunk_bytes
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries = {}  # url -> {"value", "etag", "last_modified", "fetched_at", "checked_at"}
+        self._refreshing = {}  # url -> task of the refresh in flight
+        self.hits = 0
+        self.refreshes = 0
+        self.not_modified = 0
+        self.stale_served = 0
+
+    def _fresh(self, url):
+        entry = self._entries.get(url)
+        if entry is not None and time.monotonic() - entry["checked_at"] < self.ttl:
+            return entry
+        return None
+
+    async def get(self, url):
+        """
+        Return the parsed response for url, fetching or revalidating it when the entry is
+        older than the TTL.
+        """
+        entry = self._fresh(url)
+        if entry is not None:
+            self.hits += 1
+            return entry["value"]
+
+        task = self._refreshing.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(url))
+            self._refreshing[url] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(url, None))
+        # Shielded, so a caller that times out does not cancel the refresh others are waiting on
+        return await asyncio.shield(task)
+
+    async def _refresh(self, url):
+        entry = self._entries.get(url)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = await arequest("GET", url, headers=headers, stream=self.incremental)
+            try:
+                if response.status_code == 304 and entry is not None:
+                    self.not_modified += 1
+                    entry["fetched_at"] = entry["checked_at"] = time.monotonic()
+                    return entry["value"]
+                response.raise_for_status()
+                value = await self._parse(response)
+            finally:
+                await response.aclose()
+        except Exception as e:
+            # Keep answering from the last good copy while the upstream is unavailable,
+            # and wait another TTL before asking it again
+            if entry is not None and time.monotonic() - entry["fetched_at"] < self.ttl + self.max_stale:
+                self.stale_served += 1
+                entry["checked_at"] = time.monotonic()
+                print(f"Serving cached {url} after refresh error: {e!r}")
+                return entry["value"]
+            raise
+
+        self.refreshes += 1
+        self._entries[url] = {
+            "value": value,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.monotonic(),
+            "checked_at": time.monotonic(),
+        }
+        return value
+
+    async def _parse(self, response):
+        if not self.incremental:
+            return await asyncio.to_thread(self.parse, response.content)
+        parser = self.parse()
+        async for chunk in response.aiter_bytes(self.chunk_bytes):
+            parser.feed(chunk)
+        return parser.close()
+
+    def invalidate(self, url=None):
+        """
+        Drop the cached response for url, or every cached response.
+        """
+        if url is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(url, None)
+
+    @property
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "not_modified": self.not_modified,
+            "stale_served": self.stale_served,
+        }
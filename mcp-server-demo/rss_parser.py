@@ -0,0 +1,176 @@
+import os
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from http_client import arequest
+
+# Streaming RSS parsing configuration
+RSS_CHUNK_BYTES = int(os.getenv("RSS_CHUNK_BYTES", "65536"))  # Bytes of the response body parsed at a time
+RSS_NEWEST_FIRST = os.getenv("RSS_NEWEST_FIRST", "true").lower() == "true"  # Stop at the first item older than since
+
+# Item child elements and the keys they are returned under
+RSS_FIELDS = {"title": "Title", "link": "Link", "description": "Description", "pubDate": "Publication Date"}
+
+def to_utc(value):
+    """
+    Make a datetime timezone-aware, reading naive values as UTC.
+    """
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def parse_since(since):
+    """
+    Parse an ISO 8601 date or datetime ("2024-05-06", "2024-05-06T10:00:00Z") for the since filter.
+    """
+    if not since:
+        return None
+    if isinstance(since, datetime):
+        return to_utc(since)
+    return to_utc(datetime.fromisoformat(since))
+
+@lru_cache(maxsize=65536)
+def published_at(pub_date):
+    """
+    The RFC 822 pubDate of an item as an aware datetime, or None when it is missing or malformed.
+    """
+    if not pub_date:
+        return None
+    try:
+        return to_utc(parsedate_to_datetime(pub_date))
+    except (TypeError, ValueError):
+        return None
+
+class RssItemTarget:
+    """
+    XMLParser target that extracts <item> fields in one pass as the parser reports each
+    element, without building an element tree. Completed items are passed to on_item.
+    """
+
+    def __init__(self, on_item):
+        self.on_item = on_item
+        self.depth = 0
+        self.item_depth = None  # Depth of the <item> being read
+        self.item = None
+        self.seen = set()
+        self.key = None  # Output key of the field whose text is being read
+        self.text = []
+        self.reading = False  # Inside the field's leading text (what element.text would hold)
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.item is None:
+            if tag == "item":
+                self.item = dict.fromkeys(RSS_FIELDS.values())
+                self.item_depth = self.depth
+                self.seen = set()
+        elif self.depth == self.item_depth + 1:
+            key = RSS_FIELDS.get(tag)
+            if key is not None and key not in self.seen:  # The first occurrence wins, like element.find
+                self.seen.add(key)
+                self.key = key
+                self.reading = True
+        else:
+            self.reading = False
+
+    def data(self, text):
+        if self.reading:
+            self.text.append(text)
+
+    def end(self, tag):
+        if self.item is not None:
+            if self.depth == self.item_depth:
+                item, self.item = self.item, None
+                self.on_item(item)
+            elif self.depth == self.item_depth + 1 and self.key is not None:
+                self.item[self.key] = "".join(self.text) if self.text else None
+                self.key = None
+                self.text = []
+                self.reading = False
+        self.depth -= 1
+
+    def close(self):
+        return None
+
+class RssStreamParser:
+    """
+    Incremental RSS parser: feed() it the document in chunks of any size and close() it
+    to get the items. Memory holds the extracted items, never the document or a tree.
+
+    With limit or since the parser stops early: after limit items, or (for newest-first
+    feeds) at the first item published before since. Items without a readable pubDate
+    are kept. done tells the caller that the rest of the document is not needed.
+    """
+
+    def __init__(self, limit=None, since=None, newest_first=RSS_NEWEST_FIRST):
+        self.limit = limit or None
+        self.since = parse_since(since)
+        self.newest_first = newest_first
+        self.items = []
+        self.done = False
+        self._parser = ET.XMLParser(target=RssItemTarget(self._add))
+
+    def feed(self, data):
+        if not self.done:
+            self._parser.feed(data)
+
+    def close(self):
+        """
+        Finish parsing and return the list of item dictionaries.
+        """
+        if not self.done:
+            self._parser.close()
+        return self.items
+
+    def _add(self, item):
+        if self.done:
+            return
+        if self.since is not None:
+            published = published_at(item["Publication Date"])
+            if published is not None and published < self.since:
+                self.done = self.newest_first
+                return
+        self.items.append(item)
+        if self.limit is not None and len(self.items) >= self.limit:
+            self.done = True
+
+def parse_rss(xml_data, limit=None, since=None):
+    """
+    Parse a complete RSS document (bytes or str) into a list of dictionaries with the
+    title, link, description and publication date of each item.
+    """
+    parser = RssStreamParser(limit, since)
+    for start in range(0, len(xml_data), RSS_CHUNK_BYTES):
+        parser.feed(xml_data[start:start + RSS_CHUNK_BYTES])
+        if parser.done:
+            break
+    parser.close()
+    return parser.items
+
+def select_items(items, limit=None, since=None):
+    """
+    Apply limit and since to already parsed items, such as a cached feed.
+    """
+    since = parse_since(since)
+    if since is not None:
+        items = [item for item in items if (published := published_at(item["Publication Date"])) is None
+                 or published >= since]
+    return items[:limit] if limit else items
+
+async def afetch_rss(url, limit=None, since=None, headers=None):
+    """
+    Download and parse an RSS feed chunk by chunk. Once limit or since is satisfied the
+    rest of the body is not downloaded. Returns the list of item dictionaries.
+    """
+    parser = RssStreamParser(limit, since)
+    response = await arequest("GET", url, stream=True, headers=headers)
+    try:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(RSS_CHUNK_BYTES):
+            parser.feed(chunk)
+            if parser.done:
+                break
+    finally:
+        await response.aclose()
+    parser.close()
+    return parser.items
@@ -1,16 +1,18 @@
 # server.py
 from mcp.server.fastmcp import FastMCP
-import sys, requests, re, os
+import sys, re, os
 import pandas as pd
 import xml.etree.ElementTree as ET
 
+from http_client import request
+
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Create an MCP server
-mcp = FastMCP("Demo", dependencies=["pandas", "numpy", "requests", "dotenv"])
+mcp = FastMCP("Demo", dependencies=["pandas", "numpy", "httpx", "dotenv"])
 
 # Add an addition tool
 @mcp.tool()
@@ -58,7 +60,7 @@ def get_travel_locations():
     """
     # Fetch the log file from the URL
     url = os.getenv('TRAVEL_LOCATIONS_URL')
-    response = requests.get(url)
+    response = request("GET", url)  # Pooled keep-alive connection shared by all tool calls
     if response.status_code != 200:
         return ["Error: Unable to fetch logs"]
 
@@ -87,7 +89,7 @@ def fetch_rss_feed():
     feed_url = 'https://feeds.feedburner.com/adb_news'
 
     try:
-        response = requests.get(feed_url)
+        response = request("GET", feed_url)
         response.raise_for_status()  # Raise an error for bad HTTP responses
         xml_data = response.content
 
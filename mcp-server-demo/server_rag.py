@@ -1,13 +1,19 @@
 # server.py
 # from mcp.server.fastmcp import FastMCP
 from fastmcp import FastMCP
-import sys, requests, re, os
+import sys, os
+import asyncio
+import httpx
 import pandas as pd
-import xml.etree.ElementTree as ET
 
-import chromadb
-from chromadb.utils import embedding_functions
-from openai import AzureOpenAI
+# The retrieval modules are shared with the ../rag scripts rather than copied here;
+# RAG_MODULES_PATH points elsewhere when they are installed in another location
+sys.path.append(os.getenv("RAG_MODULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rag")))
+from retriever import get_retriever
+from http_client import arequest, metrics as http_metrics
+from response_cache import ResponseCache
+from log_parser import afetch_travel_log, parse_time_bound
+from rss_parser import RSS_CHUNK_BYTES, RssStreamParser, afetch_rss, parse_since, select_items
 
 from dotenv import load_dotenv
 
@@ -31,16 +37,16 @@ DATABRICKS_CATALOG = os.getenv('DATABRICKS_CATALOG')
 DATABRICKS_SCHEMA = os.getenv('DATABRICKS_SCHEMA')
 RELEVANT_COLUMNS = os.getenv('RELEVANT_COLUMNS')
 
-# Initialize Azure OpenAI client
-azure_openai_client = AzureOpenAI(
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_API_KEY
-)
+# Per-tool time limits in seconds; a tool that runs over gives up instead of holding its session
+TOOL_TIMEOUT_SECONDS = float(os.getenv('TOOL_TIMEOUT_SECONDS', '30'))
+TRAVEL_LOCATIONS_TIMEOUT = float(os.getenv('TRAVEL_LOCATIONS_TIMEOUT', TOOL_TIMEOUT_SECONDS))
+RSS_FEED_TIMEOUT = float(os.getenv('RSS_FEED_TIMEOUT', TOOL_TIMEOUT_SECONDS))
+CAREERS_TIMEOUT = float(os.getenv('CAREERS_TIMEOUT', TOOL_TIMEOUT_SECONDS))
+RAG_TIMEOUT = float(os.getenv('RAG_TIMEOUT', TOOL_TIMEOUT_SECONDS))
 
-# Initialize ChromaDB client
-CHROMA_DATA_PATH = "./chromadb"  # Path to the ChromaDB data directory
-chroma_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
+# Seconds a parsed RSS feed is served from memory before it is revalidated with the upstream
+# (0 disables the cache: every call streams the feed and stops as soon as limit/since are met)
+RSS_FEED_CACHE_TTL = float(os.getenv('RSS_FEED_CACHE_TTL', '300'))
 
 
 # Create an MCP server
@@ -54,57 +60,59 @@ def get_greeting(name: str) -> str:
     """Get a personalized greeting"""
     return f"Hello, {name}!"
 
-def parse_log(log_text):
-    """
-    Parse the log text to extract timestamp, longitude, and latitude.
-    :param log_text: Raw log text.
-    :return: A DataFrame with parsed data.
-    """
-    # Define a regex pattern to extract timestamp, longitude, and latitude
-    log_pattern = r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - .*GET .*lng=(?P<lng>[\d.]+)&lat=(?P<lat>[\d.]+)"
-    
-    # Find all matches in the log text
-    matches = re.findall(log_pattern, log_text)
-    
-    # Convert matches to a DataFrame
-    df = pd.DataFrame(matches, columns=["timestamp", "lng", "lat"])
-    return df
-
 @mcp.tool()
-def get_travel_locations():
+async def get_travel_locations(start: str = "", end: str = ""):
     """
     Fetch travel locations from the log file and parse them into a structured format.
 
-    The function retrieves the log file from a predefined URL, parses the log text to extract
-    timestamp, longitude, and latitude, and returns the data as a Pandas DataFrame.
+    The function streams the log file from a predefined URL and parses it as it arrives,
+    extracting the timestamp, longitude, and latitude of every tracking request.
+
+    Args:
+        start (str): Only return locations logged at or after this ISO datetime,
+            e.g. "2024-05-06T10:00:00" (empty for no lower bound).
+        end (str): Only return locations logged before this ISO datetime (empty for no upper bound).
 
     Returns:
-        pd.DataFrame: A DataFrame containing the parsed travel locations with columns:
-                      - "timestamp": The timestamp of the log entry.
-                      - "lng": The longitude value.
-                      - "lat": The latitude value.
+        str: JSON records of the parsed travel locations with keys:
+                      - "timestamp": The ISO timestamp of the log entry.
+                      - "lng": The longitude value (float).
+                      - "lat": The latitude value (float).
                       Or a list with an error message if the logs cannot be fetched.
     """
+    try:
+        start, end = parse_time_bound(start), parse_time_bound(end)
+    except ValueError:
+        raise Exception(f"Invalid time window: start={start!r}, end={end!r}")
+
     # Fetch the log file from the URL
     url = os.getenv('TRAVEL_LOCATIONS_URL')
-    response = requests.get(url)
-    if response.status_code != 200:
+    try:
+        async with asyncio.timeout(TRAVEL_LOCATIONS_TIMEOUT):
+            # Parsed chunk by chunk off the event loop; lines outside the window are skipped
+            df = await afetch_travel_log(url, start, end)
+    except (httpx.HTTPError, TimeoutError):
         return ["Error: Unable to fetch logs"]
 
-    # Parse the log file
-    log_text = response.text
-    df = parse_log(log_text)
+    return df.to_json(orient="records", date_format="iso")
 
-    return df.to_json(orient="records")
+# Parsed feeds, kept in memory and revalidated with conditional GETs once the TTL has passed
+rss_cache = ResponseCache(RssStreamParser, ttl=RSS_FEED_CACHE_TTL, incremental=True, chunk_bytes=RSS_CHUNK_BYTES)
 
 @mcp.tool()
-def fetch_rss_feed():
+async def fetch_rss_feed(limit: int = 0, since: str = ""):
     """
     Fetches an RSS feed from a predefined URL and parses it into a structured format.
 
     The function retrieves the RSS feed, parses the XML data, and extracts relevant fields 
     such as title, link, description, and publication date. The extracted data is returned 
-    as a list of dictionaries.
+    as a list of dictionaries. The parsed feed is cached for RSS_FEED_CACHE_TTL seconds and
+    then revalidated with the upstream (ETag / Last-Modified).
+
+    Args:
+        limit (int): Return at most this many items (0 for all).
+        since (str): Only return items published on or after this ISO date or datetime,
+            e.g. "2024-05-06" or "2024-05-06T10:00:00Z".
 
     Returns:
         list[dict]: A list of dictionaries containing the RSS feed data with keys:
@@ -114,30 +122,18 @@ def fetch_rss_feed():
                     - "Publication Date": The publication date of the RSS feed item.
     """
     feed_url = RSS_FEED_URL
+    try:
+        since = parse_since(since)
+    except ValueError:
+        raise Exception(f"Invalid since date: {since!r}")
 
     try:
-        response = requests.get(feed_url)
-        response.raise_for_status()  # Raise an error for bad HTTP responses
-        xml_data = response.content
-
-        # Parse the XML data
-        root = ET.fromstring(xml_data)
-        items = root.findall(".//item")
-
-        # Extract relevant fields
-        feed_data = []
-        for item in items:
-            title = item.find("title").text if item.find("title") is not None else None
-            link = item.find("link").text if item.find("link") is not None else None
-            description = item.find("description").text if item.find("description") is not None else None
-            pub_date = item.find("pubDate").text if item.find("pubDate") is not None else None
-
-            feed_data.append({
-                "Title": title,
-                "Link": link,
-                "Description": description,
-                "Publication Date": pub_date
-            })
+        async with asyncio.timeout(RSS_FEED_TIMEOUT):
+            if RSS_FEED_CACHE_TTL > 0:
+                # Streamed and parsed only when the cached copy has expired
+                feed_data = select_items(await rss_cache.get(feed_url), limit, since)
+            else:
+                feed_data = await afetch_rss(feed_url, limit, since)
 
         # # Create a Pandas DataFrame
         # df = pd.DataFrame(feed_data)
@@ -145,89 +141,46 @@ def fetch_rss_feed():
         return feed_data
 
     except Exception as e:
-        print(f"Error fetching RSS feed: {e}")
+        print(f"Error fetching RSS feed: {e!r}")
         return pd.DataFrame()
     
-def embed_query_azure(query):
+async def aget_retriever():
     """
-    Generate an embedding for a query using Azure OpenAI's API.
+    The shared retriever. Building it opens the collection and may load or rebuild the
+    index, so the first call does that in a worker thread instead of on the event loop.
     """
-    try:
-        response = azure_openai_client.embeddings.create(
-            input=query,  # Pass the entire list of texts
-            model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        raise Exception(f"Azure OpenAI API error: {e}")
+    return await asyncio.to_thread(get_retriever)
 
-def query_chromadb(query, top_k=5):
+async def query_chromadb(query, top_k=5, where=None):
     """
-    Query ChromaDB for the most relevant chunks based on the query.
+    Query ChromaDB for the most relevant chunks based on the query, optionally restricted
+    by a metadata filter (a where clause or a filter expression).
     """
-    # Generate embedding for the query
-    query_embedding = embed_query_azure(query)
-
-    # Retrieve the most relevant chunks from ChromaDB
-    collection_name = "genie_text_metadata"
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-            api_key=AZURE_OPENAI_API_KEY,
-            model_name=AZURE_OPENAI_DEPLOYMENT_NAME
-        )
-    )
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
-    )
-
-    return results
-
-def summarize_results(query, documents):
-    """
-    Summarize the retrieved documents in the context of the query using Azure OpenAI's GPT model.
-    """
-    try:
-        # Prepare the prompt for summarization
-        prompt = f"""
-        You are an assistant that summarizes information in the context of a user's query.
-        Query: {query}
-        Relevant Information:
-        {documents}
-        Provide a concise summary of the relevant information in the context of the query.
-        """
-
-        # Call Azure OpenAI GPT model for summarization
-        response = azure_openai_client.chat.completions.create(
-            model=AZURE_OPENAI_CHAT_DEPLOYMENT_NAME,  # Use the GPT deployment name
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        # Extract and return the summary
-        return response.choices[0].message.content
-    except Exception as e:
-        raise Exception(f"Azure OpenAI GPT summarization error: {e}")
-
+    # The retriever keeps the collection and embedding clients open across tool calls
+    return await (await aget_retriever()).aquery(query, top_k, where)
 
 @mcp.tool()
-def fetch_rag_data(query: str, top_k: int = 5):
+async def fetch_rag_data(query: str, top_k: int = 5, filters: str = ""):
     """
     Fetch relevant document insights from RAG database based on the user's query.
 
     Args:
         query (str): The user's query to search for relevant data.
         top_k (int): The number of top results to retrieve from ChromaDB.
+        filters (str): Optional metadata filter that restricts the search, e.g.
+            'file_name == "sales.xlsx" and row >= 100 and row < 200'. Fields include
+            source, file_name, sheet, row and ingested_at; comparisons (==, !=, <, <=, >, >=,
+            in [...], not in [...]) can be combined with and/or and parentheses.
 
     Returns:
         list: List of relevant document insights retrieved from database.
     """
     # Query ChromaDB for relevant chunks
-    results = query_chromadb(query, top_k)
+    try:
+        async with asyncio.timeout(RAG_TIMEOUT):
+            results = await query_chromadb(query, top_k, filters)
+    except TimeoutError:
+        raise Exception(f"RAG retrieval timed out after {RAG_TIMEOUT}s")
 
     # # Summarize the retrieved documents
     # summary = summarize_results(query, results)
@@ -245,7 +198,52 @@ def fetch_rag_data(query: str, top_k: int = 5):
     return results
 
 @mcp.tool()
-def fetch_careers():
+async def fetch_rag_data_batch(queries: list[str], top_k: int = 5, filters: str = ""):
+    """
+    Fetch relevant document insights from RAG database for several queries at once.
+
+    All queries are embedded in one request and searched in one vector query, which is
+    much faster than calling fetch_rag_data once per query.
+
+    Args:
+        queries (list[str]): The queries to search for relevant data.
+        top_k (int): The number of top results to retrieve from ChromaDB per query.
+        filters (str): Optional metadata filter applied to every query (see fetch_rag_data).
+
+    Returns:
+        list: One result per query, in the same order as the queries.
+    """
+    try:
+        async with asyncio.timeout(RAG_TIMEOUT):
+            return await (await aget_retriever()).aquery_many(queries, top_k, filters)
+    except TimeoutError:
+        raise Exception(f"RAG retrieval timed out after {RAG_TIMEOUT}s")
+
+@mcp.tool()
+async def get_retrieval_metrics():
+    """
+    Report retrieval latency percentiles (embedding, vector search and total, in ms)
+    over the most recent RAG queries served by this process.
+
+    Returns:
+        dict: Query count and p50/p95/p99 latency per retrieval step.
+    """
+    return (await aget_retriever()).metrics()
+
+@mcp.tool()
+def get_http_metrics():
+    """
+    Report upstream HTTP client statistics for this process: requests sent, connections
+    opened and reused from the keep-alive pool, requests per HTTP version (HTTP/2 use),
+    retries, errors and latency, plus hits and revalidations of the RSS feed cache.
+
+    Returns:
+        dict: Request, connection reuse and latency counters for the shared HTTP client.
+    """
+    return {**http_metrics.stats, "rss_cache": rss_cache.stats}
+
+@mcp.tool()
+async def fetch_careers():
     """
     Fetches the latest career positions from the database.
 
@@ -265,7 +263,12 @@ def fetch_careers():
                 "statement": DATABRICKS_SQL_STATEMENT
             }
 
-    response = requests.post(url=endpoint, headers=headers, json=body)
+    try:
+        async with asyncio.timeout(CAREERS_TIMEOUT):
+            response = await arequest("POST", endpoint, headers=headers, json=body)
+    except (httpx.HTTPError, TimeoutError) as e:
+        print(f"Error: {e!r}")
+        return None
 
     if response.status_code == 200:
         print("Query submitted successfully.")
@@ -290,7 +293,7 @@ if __name__ == "__main__":
             transport="streamable-http",
             # host="127.0.0.1", # for local testing
             host="0.0.0.0",
-            port=8081,
+            port=int(os.getenv("MCP_PORT", "8081")),
             path="/mcp",
             log_level="debug",
         )
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Semantic answer cache configuration
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Minimum cosine similarity
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by query embedding and retrieved chunk ids.
+
+    A new query reuses a cached answer when its embedding is within the cosine similarity
+    threshold of a cached query and retrieval returned the same set of chunks, so the
+    answer was produced from identical context. Entries are evicted least-recently-used
+    and after a time-to-live, and the whole cache is dropped when the collection changes.
+    """
+
+    def __init__(self, similarity=ANSWER_CACHE_SIMILARITY, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.collection_version = None
+        self._entries = OrderedDict()  # entry id -> (expires_at, unit embedding, chunk ids, answer)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def check_collection(self, version):
+        """
+        Drop every entry if the collection has changed since the answers were cached.
+        version is any value that changes with the collection contents, e.g. its count.
+        """
+        with self._lock:
+            if version != self.collection_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.collection_version = version
+
+    def _unit(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_embedding, chunk_ids):
+        """
+        Return the cached answer for a similar query with the same retrieved chunks, or None.
+        """
+        query = self._unit(query_embedding)
+        chunk_ids = frozenset(chunk_ids)
+        now = time.time()
+        with self._lock:
+            best_id, best_similarity = None, self.similarity
+            for entry_id, (expires_at, embedding, entry_chunk_ids, _) in list(self._entries.items()):
+                if expires_at < now:
+                    del self._entries[entry_id]
+                    continue
+                if entry_chunk_ids != chunk_ids:
+                    continue
+                similarity = float(embedding @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][3]
+
+    def put(self, query_embedding, chunk_ids, answer):
+        """
+        Cache an answer generated for a query and its retrieved chunks.
+        """
+        with self._lock:
+            self._entries[self._next_id] = (time.time() + self.ttl_seconds, self._unit(query_embedding),
+                                            frozenset(chunk_ids), answer)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """
+        Hit/miss counters since the cache was created.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+        }
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """
+    Return the process-wide SemanticAnswerCache.
+    """
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache()
+        return _answer_cache
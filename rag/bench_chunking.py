@@ -0,0 +1,77 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from chunking import chunk_rows
+
+WORDS = ("invoice payment supplier contract delivery region quarter revenue forecast "
+         "customer account balance ledger audit policy report summary order").split()
+
+def make_synthetic_rows(n_rows, seed=0):
+    """
+    Build a doc_text column with a mix of short and multi-sentence rows.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(5, 25))).capitalize() + "."
+            for _ in range(rng.choice((1, 1, 2, 4, 12, 40)))
+        ]
+        rows.append(f"Record {i}. " + " ".join(sentences))
+    return pd.DataFrame({"doc_text": rows})
+
+def legacy_chunk_text(data, chunk_size=500):
+    """
+    The original chunker: join every row into one string and slice at fixed character offsets.
+    """
+    combined_text = " ".join(data.astype(str).fillna("").apply(" ".join, axis=1))
+    return [combined_text[i:i+chunk_size] for i in range(0, len(combined_text), chunk_size)]
+
+def row_aware_chunk_text(data):
+    chunks, _ = chunk_rows(data["doc_text"])
+    return chunks
+
+def streamed_row_aware_chunk_text(data, batch_rows=10_000):
+    """
+    Chunk in row batches the way the ingest pipeline does, handing each batch downstream.
+    """
+    n_chunks = 0
+    for start in range(0, len(data), batch_rows):
+        chunks, _ = chunk_rows(data["doc_text"].iloc[start:start + batch_rows])
+        n_chunks += len(chunks)
+    return n_chunks
+
+def run(name, chunker, data):
+    """
+    Time a chunker, then run it again under tracemalloc to measure its peak allocation.
+    """
+    start = time.perf_counter()
+    n_chunks = chunker(data)
+    elapsed = time.perf_counter() - start
+    if not isinstance(n_chunks, int):
+        n_chunks = len(n_chunks)
+
+    tracemalloc.start()
+    chunker(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<12} {n_chunks:>10} chunks {elapsed:>8.2f}s "
+          f"{n_chunks / elapsed:>12,.0f} chunks/s {len(data) / elapsed:>12,.0f} rows/s "
+          f"{peak / 2**20:>9.1f} MiB peak")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the legacy and row-aware chunkers.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        data = make_synthetic_rows(n_rows)
+        print(f"\n{n_rows:,} rows")
+        run("legacy", legacy_chunk_text, data)
+        run("row-aware", row_aware_chunk_text, data)
+        run("streamed", streamed_row_aware_chunk_text, data)
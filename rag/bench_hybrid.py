@@ -0,0 +1,150 @@
+import argparse
+import hashlib
+import json
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from lexical_index import LexicalIndex, tokenize
+from query_cache import QueryEmbeddingCache
+from retriever import Retriever
+
+WORDS = ("invoice payment supplier contract delivery region quarter revenue forecast "
+         "customer account balance ledger audit policy report summary order").split()
+
+class HashingEmbedder:
+    """
+    Deterministic offline embedder: signed feature hashing of word tokens. Like a real
+    dense model, it captures topical overlap but blurs rare exact identifiers.
+    """
+
+    MODEL_NAME = "hashing-embedder"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def __call__(self, texts):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                embeddings[i, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+def make_corpus(n_chunks, seed=0):
+    """
+    Chunks that each carry a unique record code among generic business text.
+    """
+    rng = random.Random(seed)
+    return [
+        f"Record code ID-{i:07d}. " + " ".join(rng.choices(WORDS, k=rng.randint(20, 60))).capitalize() + "."
+        for i in range(n_chunks)
+    ]
+
+QUERY_TYPES = {
+    "code lookup": lambda rng, code: f"record {code}",
+    "code + topic": lambda rng, code: f"{rng.choice(WORDS)} {code}",
+}
+
+def make_queries(n_queries, n_chunks, seed=1):
+    """
+    Queries that mention a record code, alone or with a topical word; the chunk with that
+    code is the answer. Returns {query type: (queries, target positions)}.
+    """
+    rng = random.Random(seed)
+    query_sets = {}
+    for query_type, make_query in QUERY_TYPES.items():
+        targets = rng.sample(range(n_chunks), n_queries)
+        query_sets[query_type] = ([make_query(rng, f"ID-{target:07d}") for target in targets], targets)
+    return query_sets
+
+def run(name, retriever, queries, target_ids, top_k, query_type):
+    latencies, hits = [], 0
+    for query, target_id in zip(queries, target_ids):
+        start = time.perf_counter()
+        results = retriever.query(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += target_id in results["ids"][0]
+    result = {
+        "query_type": query_type,
+        "setting": name,
+        "results_returned": top_k,
+        "recall": round(hits / len(queries), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+    print(f"{query_type:<14} {name:<28} {top_k:>7} {result['recall']:>8.3f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}")
+    return result
+
+def run_bm25(lexical_index, queries, target_ids, top_k, query_type):
+    latencies, hits = [], 0
+    for query, target_id in zip(queries, target_ids):
+        start = time.perf_counter()
+        ranking = lexical_index.search(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += target_id in [chunk_id for chunk_id, _ in ranking]
+    result = {
+        "query_type": query_type,
+        "setting": "bm25 only",
+        "results_returned": top_k,
+        "recall": round(hits / len(queries), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+    print(f"{query_type:<14} {'bm25 only':<28} {top_k:>7} {result['recall']:>8.3f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dense, over-fetched dense and hybrid BM25 + dense retrieval.")
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--overfetch", type=int, default=4, help="Multiplier for the over-fetched dense baseline.")
+    parser.add_argument("--output", default="bench_hybrid_report.json")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        embedder = HashingEmbedder()
+        texts = make_corpus(args.chunks)
+        ids = [f"chunk_{i}" for i in range(args.chunks)]
+        query_sets = make_queries(args.queries, args.chunks)
+
+        # Query embedding caching is disabled so every timed query pays for its embedding
+        start = time.perf_counter()
+        dense = Retriever(chroma_path=f"{workdir}/chromadb", embedder=embedder, mode="dense", engine="chroma",
+                          query_cache=QueryEmbeddingCache(max_entries=0, disk_path=""))
+        lexical_index = LexicalIndex(f"{workdir}/lexical_index.sqlite")
+        for i in range(0, args.chunks, 5000):
+            dense.collection.add(ids=ids[i:i + 5000], documents=texts[i:i + 5000],
+                                 embeddings=embedder(texts[i:i + 5000]))
+            lexical_index.add(ids[i:i + 5000], texts[i:i + 5000])
+        print(f"Indexed {args.chunks:,} chunks in {time.perf_counter() - start:.1f}s\n")
+
+        hybrid = Retriever(chroma_path=f"{workdir}/chromadb", embedder=embedder, mode="hybrid", engine="chroma",
+                           lexical_index=lexical_index, query_cache=QueryEmbeddingCache(max_entries=0, disk_path=""))
+
+        print(f"{'queries':<14} {'setting':<28} {'results':>7} {'recall':>8} {'p50 ms':>9} {'p95 ms':>9}")
+        results = []
+        for query_type, (queries, targets) in query_sets.items():
+            target_ids = [ids[target] for target in targets]
+            results += [
+                run("dense", dense, queries, target_ids, args.top_k, query_type),
+                run(f"dense over-fetch x{args.overfetch}", dense, queries, target_ids, args.top_k * args.overfetch,
+                    query_type),
+                run_bm25(lexical_index, queries, target_ids, args.top_k, query_type),
+                run("hybrid (bm25 + dense, rrf)", hybrid, queries, target_ids, args.top_k, query_type),
+            ]
+
+        with open(args.output, "w") as f:
+            json.dump({"chunks": args.chunks, "queries": args.queries, "top_k": args.top_k, "results": results},
+                      f, indent=2)
+        print(f"\nRecall is the share of queries whose record-code chunk is among the results returned.\n"
+              f"Report written to {args.output}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+WORDS = ("invoice payment supplier contract delivery region quarter revenue forecast "
+         "customer account balance ledger audit policy report summary order").split()
+FAKE_EMBEDDING_DIM = 384
+
+def make_corpus(path, n_rows, seed=0, rows_per_write=100_000):
+    """
+    Write a synthetic doc_text corpus of n_rows rows as CSV, Parquet or Excel (by extension).
+    """
+    rng = random.Random(seed)
+
+    def rows(start, stop):
+        return pd.DataFrame({
+            "doc_text": [
+                f"Record {i} code ID-{i:07d}. " + " ".join(
+                    " ".join(rng.choices(WORDS, k=rng.randint(5, 25))).capitalize() + "."
+                    for _ in range(rng.choice((1, 2, 3, 6, 20)))
+                )
+                for i in range(start, stop)
+            ]
+        })
+
+    if path.endswith(".csv"):
+        for start in range(0, n_rows, rows_per_write):
+            rows(start, min(n_rows, start + rows_per_write)).to_csv(
+                path, mode="w" if start == 0 else "a", header=start == 0, index=False
+            )
+    elif path.endswith(".parquet"):
+        rows(0, n_rows).to_parquet(path, index=False)
+    else:
+        rows(0, n_rows).to_excel(path, index=False)
+
+def fake_embeddings(texts):
+    """
+    Deterministic fake embedder: unit vectors seeded from a hash of each text.
+    """
+    embeddings = np.empty((len(texts), FAKE_EMBEDDING_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        embeddings[i] = np.random.default_rng(seed).standard_normal(FAKE_EMBEDDING_DIM, dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.tolist()
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (2**20 if platform.system() == "Darwin" else 2**10)
+
+def run_ingest(corpus_path, resync=False):
+    """
+    Run the load_excel_to_chromadb sync path on one corpus and return its measurements.
+    Must run in a fresh process configured through environment variables (see main).
+    """
+    import load_excel_to_chromadb as ingest
+    from chunking import INGEST_METADATA_COLUMNS, chunk_row_batch
+    from stream_reader import existing_columns, iter_row_batches, source_metadata
+
+    # Swap the real embedding backends for the deterministic fake, keeping the cache in the path
+    ingest.embed_texts_chromadb = lambda texts: ingest.embedding_cache.embed("fake-embedder", texts, fake_embeddings)
+
+    # Read and chunk exactly as the loader's __main__ does
+    source = os.path.abspath(corpus_path)
+    metadata = source_metadata(source)
+    columns = ["doc_text", *existing_columns(source, INGEST_METADATA_COLUMNS)]
+
+    def sync():
+        counts = {"rows": 0}
+
+        def chunker(rows):
+            counts["rows"] += len(rows)
+            return chunk_row_batch(rows, source=source, metadata=metadata)
+
+        start = time.perf_counter()
+        summary = ingest.sync_chunk_batches(
+            iter_row_batches(source, columns=columns),
+            use_azure=False,
+            source=source,
+            chunker=chunker
+        )
+        seconds = time.perf_counter() - start
+        return {
+            "rows": counts["rows"],
+            "chunks": summary["new"] + summary["unchanged"],
+            "embedded": summary["new"],
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(counts["rows"] / seconds, 1),
+            "chunks_per_second": round((summary["new"] + summary["unchanged"]) / seconds, 1),
+            "stage_timings": summary["stage_timings"],
+        }
+
+    report = sync()
+    if resync:
+        # A second run over the unchanged corpus measures the incremental (no-op) sync cost
+        report["resync"] = sync()
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+def run_in_subprocess(corpus_path, workdir, resync=False):
+    """
+    Run one ingest in a fresh process so peak RSS and stores are not shared between corpora.
+    """
+    env = {
+        **os.environ,
+        "CHROMA_DATA_PATH": os.path.join(workdir, "chromadb"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.sqlite"),
+        "EMBEDDING_BACKEND": "local",  # No Azure client; the fake embedder is swapped in
+        "INGEST_MAX_ROWS": "",
+    }
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", corpus_path]
+    if resync:
+        command.append("--resync")
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"Benchmark run failed for {corpus_path}:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingest pipeline on synthetic corpora, offline.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--format", choices=["csv", "parquet", "xlsx"], default="csv")
+    parser.add_argument("--resync", action="store_true", help="Also time a second, no-change sync.")
+    parser.add_argument("--output", default="bench_ingest_report.json")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated corpora and stores.")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print("BENCH_RESULT " + json.dumps(run_ingest(args.run_one, args.resync)))
+        sys.exit(0)
+
+    results = []
+    for n_rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix=f"bench_ingest_{n_rows}_")
+        corpus_path = os.path.join(workdir, f"corpus_{n_rows}.{args.format}")
+        try:
+            start = time.perf_counter()
+            make_corpus(corpus_path, n_rows)
+            print(f"Built {n_rows:,}-row corpus in {time.perf_counter() - start:.1f}s; ingesting...")
+
+            result = {"corpus_rows": n_rows, "format": args.format, **run_in_subprocess(corpus_path, workdir, args.resync)}
+            results.append(result)
+            stages = {name: stage["busy_seconds"] for name, stage in result["stage_timings"].items()
+                      if isinstance(stage, dict)}
+            print(f"  {result['rows_per_second']:,.0f} rows/s, {result['chunks_per_second']:,.0f} chunks/s, "
+                  f"peak RSS {result['peak_rss_mb']:,.0f} MiB, busy seconds per stage {stages}")
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
@@ -0,0 +1,47 @@
+import argparse
+import random
+import time
+
+from chromadb.utils import embedding_functions
+
+from local_embeddings import LocalEmbedder
+
+WORDS = ("invoice payment supplier contract delivery region quarter revenue forecast "
+         "customer account balance ledger audit policy report summary order").split()
+
+def make_texts(n_texts, seed=0):
+    """
+    Build texts with a realistic spread of lengths, from a few words to a full chunk.
+    """
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.choice((4, 8, 16, 32, 64, 128, 200)))) for _ in range(n_texts)]
+
+def current_path(texts):
+    """
+    The previous embed_texts_chromadb: a new DefaultEmbeddingFunction per call, fixed 256-token padding.
+    """
+    embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return embedding_function(texts)
+
+def run(name, embed, texts):
+    start = time.perf_counter()
+    embed(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed:>8.2f}s {len(texts) / elapsed:>10,.0f} texts/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark local embedding throughput.")
+    parser.add_argument("--texts", type=int, default=5_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    # Warm up: download the model if needed so it is not part of the timings
+    current_path(texts[:8])
+
+    run("DefaultEmbeddingFunction", current_path, texts)
+    for workers in args.workers:
+        embedder = LocalEmbedder(batch_size=args.batch_size, workers=workers)
+        embedder.embed(texts[:8])
+        run(f"LocalEmbedder (workers={workers})", embedder.embed, texts)
@@ -0,0 +1,91 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from numpy_index import NumpyIndex, normalize_rows
+
+def build_collection(path, n_chunks, dim, seed=0, batch_size=5000):
+    """
+    Fill a fresh ChromaDB collection with random unit-length embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection(name="genie_text_metadata", embedding_function=None)
+    for start in range(0, n_chunks, batch_size):
+        stop = min(n_chunks, start + batch_size)
+        collection.add(
+            ids=[f"chunk_{i}" for i in range(start, stop)],
+            embeddings=normalize_rows(rng.standard_normal((stop - start, dim), dtype=np.float32)),
+            documents=[f"Synthetic document {i}" for i in range(start, stop)],
+            metadatas=[{"row": i} for i in range(start, stop)]
+        )
+    return collection
+
+def time_calls(fn, batches):
+    """
+    Call fn once per batch and return the per-call latencies in milliseconds.
+    """
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        fn(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+def report(name, latencies, queries_per_call):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    qps = queries_per_call * len(latencies) / (latencies.sum() / 1000)
+    print(f"{name:<34} p50 {p50:>8.2f} ms  p95 {p95:>8.2f} ms  p99 {p99:>8.2f} ms  {qps:>10,.0f} queries/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare NumpyIndex and ChromaDB query latency on synthetic data.")
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per batched call.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_numpy_index_")
+    try:
+        start = time.perf_counter()
+        collection = build_collection(f"{workdir}/chromadb", args.chunks, args.dim)
+        print(f"Built a {args.chunks:,} x {args.dim} collection in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        NumpyIndex.from_collection(collection).save(f"{workdir}/numpy_index")
+        index = NumpyIndex.load(f"{workdir}/numpy_index", mmap=False)
+        mapped_index = NumpyIndex.load(f"{workdir}/numpy_index", mmap=True)
+        print(f"Exported and loaded the NumPy index ({index.embeddings.nbytes / 2**20:,.1f} MiB) "
+              f"in {time.perf_counter() - start:.1f}s\n")
+
+        queries = normalize_rows(np.random.default_rng(1).standard_normal((args.queries, args.dim), dtype=np.float32))
+        singles = [queries[i:i + 1] for i in range(len(queries))]
+        batches = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+
+        def chroma_query(batch):
+            return collection.query(query_embeddings=batch, n_results=args.top_k)
+
+        # Warm up caches and the HNSW index load so they are not part of the timings
+        chroma_query(queries[:1])
+        index.query(queries[:1], args.top_k)
+        mapped_index.query(queries[:1], args.top_k)
+
+        report("chroma (1 query/call)", time_calls(chroma_query, singles), 1)
+        report("numpy (1 query/call)", time_calls(lambda batch: index.query(batch, args.top_k), singles), 1)
+        report("numpy mmap (1 query/call)", time_calls(lambda batch: mapped_index.query(batch, args.top_k), singles), 1)
+        report(f"chroma ({args.batch_size} queries/call)", time_calls(chroma_query, batches), args.batch_size)
+        report(f"numpy ({args.batch_size} queries/call)",
+               time_calls(lambda batch: index.query(batch, args.top_k), batches), args.batch_size)
+
+        # The NumPy index is exact, so it is the ground truth for ChromaDB's approximate HNSW search
+        exact = index.query(queries, args.top_k)["ids"]
+        approximate = chroma_query(queries)["ids"]
+        recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+        print(f"\nchroma recall@{args.top_k} against exact search: {recall:.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import query_chromadb
+import retriever as retriever_module
+from bench_hybrid import WORDS, HashingEmbedder, make_corpus
+from numpy_index import normalize_rows, top_k_rows
+from query_cache import QueryEmbeddingCache
+from retriever import Retriever
+
+# Settings that can be compared: (engine, quantization)
+SETTINGS = {
+    "chroma": ("chroma", None),
+    "numpy": ("numpy", None),
+    "numpy-int8": ("numpy", "int8"),
+    "numpy-pq": ("numpy", "pq"),
+}
+
+def make_queries(n_queries, n_chunks, seed=1):
+    """
+    Synthetic queries: half topical word combinations, half record-code lookups.
+    """
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choices(WORDS, k=rng.randint(2, 6))) if i % 2 else f"record ID-{rng.randrange(n_chunks):07d}"
+        for i in range(n_queries)
+    ]
+
+def load_queries(path):
+    """
+    Load a recorded query set: a JSON list, JSON lines with a "query" field, or one query per line.
+    """
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return [str(query) for query in json.loads(text)]
+    queries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+def load_corpus(path):
+    """
+    Chunk texts from an Excel/CSV/Parquet file, the same way ingestion chunks them.
+    """
+    from chunking import chunk_row_batch
+    from stream_reader import iter_row_batches
+
+    texts = []
+    for rows in iter_row_batches(path, columns=["doc_text"]):
+        texts.extend(chunk_row_batch(rows, source=path)[0])
+    return texts
+
+def exact_top_k(corpus_embeddings, query_embeddings, top_k):
+    """
+    Brute-force ground truth: positions of the top_k corpus rows by cosine similarity.
+    """
+    scores = normalize_rows(np.asarray(query_embeddings, dtype=np.float32)) @ corpus_embeddings.T
+    return top_k_rows(scores, min(top_k, corpus_embeddings.shape[0]))[0]
+
+def run_queries(queries, top_k, concurrency):
+    """
+    Send every query through query_chromadb from concurrency threads. Returns the results
+    in query order, per-query latencies (ms) and the wall-clock time (s).
+    """
+    def timed(query):
+        start = time.perf_counter()
+        results = query_chromadb.query_chromadb(query, top_k)
+        return results, (time.perf_counter() - start) * 1000
+
+    # query_chromadb prints its timings on every call; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, queries))
+        wall_seconds = time.perf_counter() - start
+    return [results for results, _ in outcomes], np.array([latency for _, latency in outcomes]), wall_seconds
+
+def evaluate(setting, retriever, queries, exact_ids, top_k, concurrency_levels):
+    # Route query_chromadb (the path used by the chat app and the MCP server) to this retriever
+    retriever_module._retriever = retriever
+    run_queries(queries[:10], top_k, 1)  # Warm-up: index load, caches and thread start-up
+
+    rows = []
+    for concurrency in concurrency_levels:
+        results, latencies, wall_seconds = run_queries(queries, top_k, concurrency)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        found = [result["ids"][0] for result in results]
+        recall = np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact_ids) if len(e)])
+        row = {
+            "setting": setting,
+            "concurrency": concurrency,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "qps": round(len(queries) / wall_seconds, 1),
+            f"recall_at_{top_k}": round(float(recall), 4),
+        }
+        print(f"{setting:<14} {concurrency:>11} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['qps']:>10,.1f} {row[f'recall_at_{top_k}']:>8.3f}")
+        rows.append(row)
+    return rows
+
+def compare_to_baseline(results, baseline_path, top_k, tolerance):
+    """
+    Compare against an earlier report: flag settings whose p95 latency grew by more than
+    tolerance (a fraction) or whose recall dropped. Returns the list of regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = {(row["setting"], row["concurrency"]): row for row in json.load(f)["results"]}
+    regressions = []
+    recall_key = f"recall_at_{top_k}"
+    for row in results:
+        before = baseline.get((row["setting"], row["concurrency"]))
+        if before is None:
+            continue
+        if row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['setting']} x{row['concurrency']}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+        if recall_key in before and row[recall_key] < before[recall_key] - 1e-9:
+            regressions.append(f"{row['setting']} x{row['concurrency']}: recall {before[recall_key]} -> {row[recall_key]}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput and recall offline on CPU.")
+    parser.add_argument("--chunks", type=int, default=50_000, help="Synthetic corpus size (ignored with --corpus).")
+    parser.add_argument("--corpus", help="Excel/CSV/Parquet file with a doc_text column to index instead.")
+    parser.add_argument("--queries", type=int, default=500, help="Synthetic query count (ignored with --query-file).")
+    parser.add_argument("--query-file", help="Recorded queries: JSON list, JSON lines or one query per line.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--settings", nargs="+", choices=sorted(SETTINGS), default=["chroma", "numpy"])
+    parser.add_argument("--mode", choices=["dense", "hybrid"], default="dense",
+                        help="Retrieval mode; recall is always measured against exact dense search.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Client threads to test.")
+    parser.add_argument("--embedder", choices=["hashing", "local"], default="hashing",
+                        help="Deterministic feature-hashing embedder, or the local ONNX model.")
+    parser.add_argument("--query-cache", action="store_true", help="Keep the query embedding cache enabled.")
+    parser.add_argument("--output", default="bench_retrieval_report.json")
+    parser.add_argument("--baseline", help="Earlier report to check for latency or recall regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 latency growth over the baseline.")
+    args = parser.parse_args()
+
+    if args.embedder == "local":
+        from local_embeddings import get_local_embedder
+        embed = get_local_embedder().embed
+    else:
+        embed = HashingEmbedder()
+
+    texts = load_corpus(args.corpus) if args.corpus else make_corpus(args.chunks)
+    queries = load_queries(args.query_file) if args.query_file else make_queries(args.queries, len(texts))
+    ids = [f"chunk_{i}" for i in range(len(texts))]
+
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        start = time.perf_counter()
+        writer = Retriever(chroma_path=f"{workdir}/chromadb", embedder=embed, engine="chroma", mode="dense")
+        lexical_index = None
+        if args.mode == "hybrid":
+            from lexical_index import LexicalIndex
+            lexical_index = LexicalIndex(f"{workdir}/lexical_index.sqlite")
+        batches = []
+        for i in range(0, len(texts), 5000):
+            embeddings = np.asarray(embed(texts[i:i + 5000]), dtype=np.float32)
+            writer.collection.add(ids=ids[i:i + 5000], documents=texts[i:i + 5000], embeddings=embeddings,
+                                  metadatas=[{"row": row} for row in range(i, i + len(embeddings))])
+            if lexical_index is not None:
+                lexical_index.add(ids[i:i + 5000], texts[i:i + 5000])
+            batches.append(normalize_rows(embeddings))
+        corpus_embeddings = np.concatenate(batches)
+        print(f"Indexed {len(texts):,} chunks in {time.perf_counter() - start:.1f}s; {len(queries):,} queries\n")
+
+        # Ground truth from an exact scan over every corpus embedding
+        exact_ids = [[ids[i] for i in row] for row in exact_top_k(corpus_embeddings, embed(queries), args.top_k)]
+
+        print(f"{'setting':<14} {'concurrency':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries/s':>10} "
+              f"{'recall':>8}")
+        results = []
+        for setting in args.settings:
+            engine, quantization = SETTINGS[setting]
+            retriever = Retriever(
+                chroma_path=f"{workdir}/chromadb", embedder=embed, engine=engine, mode=args.mode,
+                lexical_index=lexical_index, index_path=f"{workdir}/numpy_index",  # Never the user's NUMPY_INDEX_PATH
+                query_cache=None if args.query_cache else QueryEmbeddingCache(max_entries=0, disk_path="")
+            )
+            if quantization is not None:
+                retriever.index.quantize(quantization)
+            results += evaluate(setting, retriever, queries, exact_ids, args.top_k, args.concurrency)
+
+        report = {"chunks": len(texts), "queries": len(queries), "top_k": args.top_k, "mode": args.mode,
+                  "embedder": args.embedder, "results": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRecall is measured against an exact brute-force scan of the corpus embeddings.\n"
+              f"Report written to {args.output}")
+
+        if args.baseline:
+            regressions = compare_to_baseline(results, args.baseline, args.top_k, args.tolerance)
+            for regression in regressions:
+                print(f"Regression: {regression}")
+            if regressions:
+                sys.exit(1)
+            print("No regressions against the baseline.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
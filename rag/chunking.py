@@ -0,0 +1,166 @@
+import datetime
+import os
+import re
+
+import pandas as pd
+
+from embedding_engine import estimate_tokens, get_encoding
+
+# Chunking configuration (sizes are in tokens)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Source columns stored as filterable chunk metadata instead of text (comma-separated), e.g. "date,region"
+INGEST_METADATA_COLUMNS = [column.strip() for column in os.getenv("INGEST_METADATA_COLUMNS", "").split(",") if column.strip()]
+
+# A sentence runs up to sentence-ending punctuation followed by whitespace, or a line break
+SENTENCE = re.compile(r"[^.!?\n]+(?:[.!?]+(?!\s|$)[^.!?\n]*)*[.!?]*")
+WORD = re.compile(r"\S+")
+
+def count_tokens_batch(texts):
+    """
+    Count tokens for a list of texts in one batched tokenizer call.
+    Falls back to counting space-separated words when tiktoken is unavailable.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return [estimate_tokens(text) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
+def split_by_tokens(text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split a single text that has no usable sentence boundaries into overlapping token windows.
+    """
+    encoding = get_encoding()
+    step = max(1, chunk_tokens - overlap_tokens)
+    if encoding is None:
+        words = WORD.findall(text)
+        return [" ".join(words[i:i + chunk_tokens]) for i in range(0, max(1, len(words) - overlap_tokens), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + chunk_tokens]).strip()
+            for i in range(0, max(1, len(tokens) - overlap_tokens), step)]
+
+def pack_sentences(sentences, token_counts, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Pack the sentences of one long text into chunks of at most chunk_tokens tokens,
+    carrying up to overlap_tokens tokens of trailing sentences into the next chunk.
+    """
+    pieces = []
+    for sentence, n_tokens in zip(sentences, token_counts):
+        if n_tokens <= chunk_tokens:
+            pieces.append((sentence, n_tokens))
+        else:
+            # A single sentence longer than a chunk is cut at token boundaries
+            windows = split_by_tokens(sentence, chunk_tokens, overlap_tokens)
+            pieces.extend(zip(windows, count_tokens_batch(windows)))
+
+    chunks = []
+    current, current_tokens = [], 0
+    for piece, n_tokens in pieces:
+        if current and current_tokens + n_tokens > chunk_tokens:
+            chunks.append(" ".join(p for p, _ in current))
+
+            # Start the next chunk with the trailing sentences that fit in the overlap
+            overlap, overlap_tokens_used = [], 0
+            for p, p_tokens in reversed(current):
+                if overlap_tokens_used + p_tokens > overlap_tokens:
+                    break
+                overlap.insert(0, (p, p_tokens))
+                overlap_tokens_used += p_tokens
+            while overlap and overlap_tokens_used + n_tokens > chunk_tokens:
+                overlap_tokens_used -= overlap.pop(0)[1]
+            current, current_tokens = overlap, overlap_tokens_used
+
+        current.append((piece, n_tokens))
+        current_tokens += n_tokens
+
+    if current:
+        chunks.append(" ".join(p for p, _ in current))
+    return chunks
+
+def to_metadata_value(value):
+    """
+    Convert a cell value to a type ChromaDB metadata accepts, or None for an empty cell.
+    Dates and times become Unix timestamps (seconds) so they can be range-filtered.
+    """
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return int(pd.Timestamp(value).timestamp())
+    if hasattr(value, "item"):
+        value = value.item()  # NumPy scalar to Python
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+def chunk_rows(texts, source="", chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, metadata=None,
+               row_metadata=None):
+    """
+    Chunk a Series of row texts (indexed by source row) without crossing row boundaries.
+
+    Rows that fit in a single chunk are kept whole; longer rows are split at sentence
+    boundaries with overlap. Returns (chunks, metadatas), where each metadata dict records
+    the source, the source row and the chunk's position within that row, plus the fields
+    of metadata (shared by every chunk) and the row's values in the row_metadata DataFrame.
+    """
+    texts = texts.fillna("").astype(str).str.strip()
+    texts = texts[texts != ""]
+    if texts.empty:
+        return [], []
+
+    # One batched tokenizer call decides which rows need splitting
+    token_counts = pd.Series(count_tokens_batch(texts.tolist()), index=texts.index)
+    long_rows = texts[token_counts > chunk_tokens]
+
+    # Split all long rows into sentences and count their tokens in a single batch
+    row_sentences = [
+        [sentence.strip() for sentence in sentences if not sentence.isspace()]
+        for sentences in long_rows.str.findall(SENTENCE)
+    ]
+    sentence_counts = count_tokens_batch([sentence for sentences in row_sentences for sentence in sentences])
+
+    long_row_chunks = {}
+    offset = 0
+    for row, sentences in zip(long_rows.index, row_sentences):
+        counts = sentence_counts[offset:offset + len(sentences)]
+        offset += len(sentences)
+        long_row_chunks[row] = pack_sentences(sentences, counts, chunk_tokens, overlap_tokens)
+
+    row_fields = {}
+    if row_metadata is not None:
+        for row, values in zip(row_metadata.index, row_metadata.to_dict("records")):
+            row_fields[row] = {key: value for key, value in
+                               ((str(key), to_metadata_value(value)) for key, value in values.items())
+                               if value is not None}
+
+    chunks, metadatas = [], []
+    for row, text in texts.items():
+        row_chunks = long_row_chunks.get(row, [text])
+        for chunk_index, chunk in enumerate(row_chunks):
+            chunks.append(chunk)
+            metadatas.append({**(metadata or {}), **row_fields.get(row, {}),
+                              "source": source, "row": int(row), "chunk_index": chunk_index})
+    return chunks, metadatas
+
+def chunk_row_batch(rows, source="", metadata=None, metadata_columns=INGEST_METADATA_COLUMNS):
+    """
+    Chunk a DataFrame of source rows: the metadata columns become filterable chunk
+    metadata and the remaining columns are combined into the chunk text.
+    """
+    metadata_columns = [column for column in metadata_columns if column in rows.columns]
+    return chunk_rows(
+        combine_columns(rows.drop(columns=metadata_columns)),
+        source=source,
+        metadata=metadata,
+        row_metadata=rows[metadata_columns] if metadata_columns else None
+    )
+
+def combine_columns(data):
+    """
+    Combine the text columns of a DataFrame into one text per row.
+    """
+    if isinstance(data, pd.Series):
+        return data
+    if data.shape[1] == 1:
+        return data.iloc[:, 0]
+    return data.fillna("").astype(str).agg(" ".join, axis=1)
@@ -0,0 +1,31 @@
+import os
+import uuid
+
+def version_path(chroma_path, collection_name):
+    """
+    Path of the change marker kept next to a ChromaDB store for one collection.
+    """
+    return os.path.join(chroma_path, f"{collection_name}.version")
+
+def bump_collection_version(chroma_path, collection_name):
+    """
+    Record that a collection's contents changed by writing a new random marker. The file
+    is replaced atomically, so readers see either the old marker or the new one.
+    """
+    path = version_path(chroma_path, collection_name)
+    os.makedirs(chroma_path, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+def read_collection_version(chroma_path, collection_name):
+    """
+    The collection's current change marker, or None if it has never been written through
+    the ingest helpers.
+    """
+    try:
+        with open(version_path(chroma_path, collection_name)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,132 @@
+import os
+
+from chunking import WORD, count_tokens_batch
+from embedding_engine import get_encoding
+
+# Context packing configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # Max tokens of retrieved text per prompt
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))  # Shared shingles to drop a chunk
+CONTEXT_MIN_TRUNCATED_TOKENS = 32  # A passage cut to fit the budget keeps at least this many tokens, or is left out
+SHINGLE_WORDS = 3
+
+def shingles(text):
+    """
+    The set of lower-cased word trigrams in a text (the words themselves for very short texts).
+    """
+    words = [word.lower() for word in WORD.findall(text)]
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def join_overlapping(first, second):
+    """
+    Join two consecutive chunks of one row, dropping the words the second repeats from
+    the end of the first (the chunking overlap).
+    """
+    first_words, second_words = first.split(), second.split()
+    for overlap in range(min(len(first_words), len(second_words)), 0, -1):
+        if first_words[-overlap:] == second_words[:overlap]:
+            return " ".join(first_words + second_words[overlap:])
+    return f"{first} {second}"
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut a text to at most max_tokens tokens, at a token boundary (a word boundary without tiktoken).
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return " ".join(WORD.findall(text)[:max_tokens])
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]).strip()
+
+def merge_adjacent(documents, metadatas):
+    """
+    Merge chunks that are consecutive pieces of the same source row into one passage,
+    placed at the rank of its best-ranked chunk. Returns (passages, chunks merged away).
+    """
+    metadatas = metadatas or [None] * len(documents)
+
+    def position(rank):
+        metadata = metadatas[rank] or {}
+        return metadata.get("source"), metadata.get("row"), metadata.get("chunk_index")
+
+    def sort_key(rank):
+        source, row, chunk_index = position(rank)
+        return str(source), str(row), -1 if chunk_index is None else chunk_index
+
+    passages = []  # [best rank, position of the last chunk, text]
+    merged = 0
+    for rank in sorted(range(len(documents)), key=sort_key):
+        source, row, chunk_index = position(rank)
+        previous = passages[-1] if passages else None
+        if (previous is not None and row is not None and chunk_index is not None
+                and previous[1] == (source, row, chunk_index - 1)):
+            previous[0] = min(previous[0], rank)
+            previous[1] = (source, row, chunk_index)
+            previous[2] = join_overlapping(previous[2], documents[rank])
+            merged += 1
+        else:
+            passages.append([rank, (source, row, chunk_index), documents[rank]])
+    passages.sort(key=lambda passage: passage[0])
+    return [text for _, _, text in passages], merged
+
+def drop_near_duplicates(passages, threshold=CONTEXT_DUPLICATE_THRESHOLD):
+    """
+    Drop passages whose word trigrams are mostly (at least threshold) contained in a
+    better-ranked passage that is kept. Returns (kept passages, number dropped).
+    """
+    kept, kept_shingles = [], []
+    for passage in passages:
+        passage_shingles = shingles(passage)
+        if not passage_shingles or any(
+            len(passage_shingles & other) >= threshold * len(passage_shingles) for other in kept_shingles
+        ):
+            continue
+        kept.append(passage)
+        kept_shingles.append(passage_shingles)
+    return kept, len(passages) - len(kept)
+
+def pack_context(documents, metadatas=None, token_budget=CONTEXT_TOKEN_BUDGET,
+                 duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD):
+    """
+    Assemble retrieved chunks (best first) into the context for one prompt: consecutive
+    chunks of the same row are merged, near-duplicates are dropped and the rest is added
+    in rank order up to token_budget tokens, cutting the last passage to fit.
+
+    Returns (context, stats), where stats compares the token count with that of joining
+    every chunk as-is.
+    """
+    documents = [document or "" for document in documents]
+    passages, merged = merge_adjacent(documents, metadatas)
+    passages, duplicates = drop_near_duplicates(passages, duplicate_threshold)
+
+    # One batched tokenizer call for the unpacked baseline and every passage
+    counts = count_tokens_batch(["\n".join(documents)] + passages) if documents else [0]
+    tokens_before, passage_tokens = counts[0], counts[1:]
+
+    selected, used, truncated, left_out = [], 0, 0, 0
+    for passage, n_tokens in zip(passages, passage_tokens):
+        remaining = token_budget - used
+        if n_tokens <= remaining:
+            selected.append(passage)
+            used += n_tokens
+        elif remaining >= CONTEXT_MIN_TRUNCATED_TOKENS and not truncated:
+            selected.append(truncate_to_tokens(passage, remaining))
+            used = token_budget
+            truncated = 1
+        else:
+            left_out += 1
+
+    context = "\n".join(selected)
+    tokens_after = count_tokens_batch([context])[0] if selected else 0
+    stats = {
+        "chunks": len(documents),
+        "passages": len(selected),
+        "merged": merged,
+        "duplicates_dropped": duplicates,
+        "truncated": truncated,
+        "left_out": left_out,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
+    return context, stats
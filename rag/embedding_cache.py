@@ -0,0 +1,157 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+# Embedding cache configuration
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2000000"))
+
+def hash_text(text):
+    """
+    Hash a chunk of text for use as a cache key.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent on-disk embedding cache keyed by (model name, text hash).
+
+    Entries are stored as float32 blobs in SQLite and evicted least-recently-used
+    once the cache holds more than max_entries embeddings. The number of entries is kept
+    in a one-row table updated by triggers, so it stays right when several processes
+    share the file and checking it does not scan the cache.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # One transaction, so no rows are written between counting them and creating the triggers
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings_count (entries INTEGER NOT NULL)")
+        self._conn.execute(
+            "INSERT INTO embeddings_count SELECT COUNT(*) FROM embeddings "
+            "WHERE NOT EXISTS (SELECT 1 FROM embeddings_count)"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_counted_insert AFTER INSERT ON embeddings "
+            "BEGIN UPDATE embeddings_count SET entries = entries + 1; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_counted_delete AFTER DELETE ON embeddings "
+            "BEGIN UPDATE embeddings_count SET entries = entries - 1; END"
+        )
+        self._conn.commit()
+
+    def get_many(self, model, texts):
+        """
+        Look up embeddings for a list of texts. Missing entries are returned as None.
+        """
+        hashes = [hash_text(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay below SQLite's host parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = list(set(hashes[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+        embeddings = [array("f", found[h]).tolist() if h in found else None for h in hashes]
+        hits = sum(embedding is not None for embedding in embeddings)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        return embeddings
+
+    def put_many(self, model, texts, embeddings):
+        """
+        Store embeddings for a list of texts, evicting the least recently used entries if needed.
+        """
+        now = time.time()
+        rows = [
+            (model, hash_text(text), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: a replace deletes without firing the count trigger
+            self._conn.executemany(
+                "INSERT INTO embeddings (model, text_hash, embedding, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (model, text_hash) DO UPDATE SET embedding = excluded.embedding, last_used = excluded.last_used",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT entries FROM embeddings_count").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+
+    def embed(self, model, texts, embed_fn):
+        """
+        Return embeddings for texts, calling embed_fn only for texts that are not cached yet.
+        """
+        texts = list(texts)
+        embeddings = self.get_many(model, texts)
+
+        # Embed each missing text once, even if it appears several times
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            new_embeddings = [list(map(float, embedding)) for embedding in embed_fn(missing)]
+            self.put_many(model, missing, new_embeddings)
+            lookup = dict(zip(missing, new_embeddings))
+            embeddings = [lookup[text] if embedding is None else embedding
+                          for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    @property
+    def stats(self):
+        """
+        Hit/miss counters since the cache was opened.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
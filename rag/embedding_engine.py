@@ -0,0 +1,210 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from openai import APIConnectionError
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a word-based estimate
+    tiktoken = None
+
+# Embedding engine configuration
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8000"))  # Tokens per request
+EMBEDDING_MAX_BATCH_ITEMS = int(os.getenv("EMBEDDING_MAX_BATCH_ITEMS", "2048"))  # Inputs per request (Azure limit)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))  # Requests in flight
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "8"))
+
+_encoding = None
+
+def get_encoding():
+    """
+    Load the cl100k_base tokenizer once; returns None if tiktoken or its data file is unavailable.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken is not installed or its encoding file cannot be downloaded (e.g. offline nodes)
+            _encoding = False
+    return _encoding or None
+
+def estimate_tokens(text):
+    """
+    Estimate the tokens in a text without a tokenizer, one per space-separated word.
+    The chunker cuts word windows of the same size when tiktoken is unavailable.
+    """
+    return text.count(" ") + 1
+
+def count_tokens(text):
+    """
+    Count the tokens in a text with tiktoken, or estimate them when the tokenizer is unavailable.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def make_micro_batches(texts, max_tokens=EMBEDDING_MAX_BATCH_TOKENS, max_items=EMBEDDING_MAX_BATCH_ITEMS):
+    """
+    Split texts into contiguous batches bounded by token count and number of inputs.
+    Returns a list of (start_index, batch) tuples so results can be put back in order.
+    """
+    batches = []
+    batch, batch_start, batch_tokens = [], 0, 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            batches.append((batch_start, batch))
+            batch, batch_start, batch_tokens = [], i, 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append((batch_start, batch))
+    return batches
+
+def is_rate_limit_error(error):
+    """
+    Check whether an exception is an HTTP 429 (rate limit) response.
+    """
+    return getattr(error, "status_code", None) == 429
+
+def is_retryable_error(error):
+    """
+    Check whether an exception is a transient error worth retrying (429, 5xx, timeouts).
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError, ConnectionError))
+
+def get_retry_after(error):
+    """
+    Read the Retry-After header (in seconds) from an API error, if the server sent one.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+    return None
+
+class EmbeddingEngine:
+    """
+    Embed texts in token-bounded micro-batches with a bounded number of requests in flight.
+
+    The number of concurrent requests adapts to the backend: it is halved on every 429
+    and grows back by one after each successful request, up to max_concurrency. The limit
+    and the Retry-After cool-down are engine state, so one engine kept for the whole load
+    carries them from call to call. All calls run on one event loop (see run).
+    """
+
+    def __init__(self, embed_batch, max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS,
+                 max_batch_items=EMBEDDING_MAX_BATCH_ITEMS, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                 max_retries=EMBEDDING_MAX_RETRIES):
+        # embed_batch is an async callable taking a list of texts and returning their embeddings
+        self.embed_batch = embed_batch
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0}
+        self._limit = self.max_concurrency
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._condition = None  # Created on the engine's event loop
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    async def aembed(self, texts):
+        """
+        Embed a list of texts concurrently and return the embeddings in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        embeddings = [None] * len(texts)
+        batches = make_micro_batches(texts, self.max_batch_tokens, self.max_batch_items)
+
+        async def run_batch(start, batch):
+            result = await self._embed_with_retry(batch)
+            embeddings[start:start + len(batch)] = result
+
+        await asyncio.gather(*(run_batch(start, batch) for start, batch in batches))
+        return embeddings
+
+    def run(self, coroutine):
+        """
+        Run a coroutine on the engine's event loop, a daemon thread started on first use, and
+        wait for its result. Async clients used by embed_batch stay bound to that one loop,
+        so their connections are reused across calls from any thread.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="embedding-engine", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def embed(self, texts):
+        """
+        Synchronous wrapper around aembed.
+        """
+        return self.run(self.aembed(texts))
+
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+        # Honour a cool-down triggered by a rate-limited request
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _release(self, rate_limited, retry_after=None):
+        async with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self._limit = max(1, self._limit // 2)
+                self._resume_at = max(self._resume_at, time.monotonic() + (retry_after or 0))
+            elif self._limit < self.max_concurrency:
+                self._limit += 1
+            self._condition.notify_all()
+
+    async def _embed_with_retry(self, batch):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            try:
+                self.stats["requests"] += 1
+                result = await self.embed_batch(batch)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    await self._release(rate_limited=False)
+                    raise
+                # Exponential backoff with jitter unless the server told us how long to wait
+                delay = get_retry_after(e) or min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                self.stats["retries"] += 1
+                if rate_limited:
+                    self.stats["rate_limited"] += 1
+                await self._release(rate_limited=rate_limited, retry_after=delay)
+                if not rate_limited:
+                    # A 429 pauses every request until resume_at, which _acquire already waits for
+                    await asyncio.sleep(delay)
+            else:
+                await self._release(rate_limited=False)
+                if len(result) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(result)}.")
+                return list(result)
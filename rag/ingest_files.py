@@ -0,0 +1,253 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from chunking import INGEST_METADATA_COLUMNS, chunk_row_batch
+from ingest_pipeline import PIPELINE_QUEUE_SIZE, print_stage_timings, run_pipeline
+from stream_reader import existing_columns, iter_row_batches, source_metadata
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xlsm", ".csv", ".parquet")
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "./ingest_manifest.json")
+
+_batch_queue = None  # Set in each pool worker by init_worker
+
+def find_files(patterns):
+    """
+    Expand directories and glob patterns into a sorted list of supported source files.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*")
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS):
+                files.add(os.path.abspath(path))
+    return sorted(files)
+
+def file_signature(path):
+    """
+    Identify a version of a file by its size and modification time.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_manifest(path=INGEST_MANIFEST_PATH):
+    """
+    Load the record of files that finished ingesting in earlier runs.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=INGEST_MANIFEST_PATH):
+    """
+    Atomically write the manifest so a crash never leaves it half-written.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def init_worker(batch_queue):
+    """
+    Give a pool worker the queue it sends its chunk batches to.
+    """
+    global _batch_queue
+    _batch_queue = batch_queue
+
+def parse_and_chunk_file(path, columns=("doc_text",)):
+    """
+    Read and chunk one source file in a worker process. Each row batch's chunks are sent
+    to the batch queue as soon as they are ready, so a worker never holds a whole file.
+    The file's last message is ("done", path, seconds) or ("error", path, message).
+    """
+    start_time = time.perf_counter()
+    try:
+        metadata = source_metadata(path)
+        for rows in iter_row_batches(path, columns=[*columns, *existing_columns(path, INGEST_METADATA_COLUMNS)]):
+            chunks, metadatas = chunk_row_batch(rows, source=path, metadata=metadata)
+            _batch_queue.put(("batch", path, chunks, metadatas, len(rows)))
+    except Exception as e:
+        # Sent as text, since not every exception can be pickled
+        _batch_queue.put(("error", path, f"{e!r}"))
+        return
+    _batch_queue.put(("done", path, time.perf_counter() - start_time))
+
+def iter_worker_messages(futures, batch_queue):
+    """
+    Yield the messages of the submitted files' workers until every file has finished.
+    """
+    remaining = set(futures.values())
+    while remaining:
+        try:
+            message = batch_queue.get(timeout=1)
+        except queue.Empty:
+            # A worker that died (e.g. killed for memory) never reports its file
+            for future, path in futures.items():
+                if path in remaining and future.done() and future.exception() is not None:
+                    remaining.discard(path)
+                    yield ("error", path, f"{future.exception()!r}")
+            continue
+        if message[0] != "batch":
+            remaining.discard(message[1])
+        yield message
+
+def ingest_files(files, workers=None, use_azure=None, manifest_path=INGEST_MANIFEST_PATH,
+                 batch_size=None, force=False, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Parse and chunk files in a process pool and feed their chunk batches, as the workers
+    produce them, through the diff, embed and store stages of the ingest pipeline. Only
+    the store stage writes to ChromaDB and the manifest. Files already ingested unchanged
+    are skipped.
+    """
+    # Imported here so pool workers do not open the ChromaDB store or API clients
+    import load_excel_to_chromadb as ingest
+
+    batch_size = batch_size or ingest.CHROMA_UPSERT_BATCH_SIZE
+    if use_azure is None:
+        use_azure = ingest.USE_AZURE_EMBEDDINGS
+    manifest = load_manifest(manifest_path)
+    pending = [
+        path for path in files
+        if force or manifest.get(path, {}).get("status") != "done"
+        or {k: manifest[path].get(k) for k in ("size", "mtime")} != file_signature(path)
+    ]
+    print(f"{len(files)} files found, {len(files) - len(pending)} already ingested, {len(pending)} to process.")
+    if not pending:
+        return
+
+    collection = ingest.chroma_client.get_or_create_collection(name="genie_text_metadata")
+    files_state = {}  # Per file being ingested: stored ids, ids seen so far and counts
+    failed = set()
+    errors = []
+    totals = {"rows": 0, "chunks": 0, "embedded": 0}
+    start_time = time.perf_counter()
+
+    with tqdm(total=len(pending), unit="file") as progress:
+        def fail(path, error):
+            # The first error of a file is reported; the rest of its batches are dropped
+            if path not in failed:
+                failed.add(path)
+                errors.append((path, error))
+                progress.update(1)
+
+        def diff_stage(message):
+            kind, path = message[:2]
+            if kind == "error":
+                fail(path, Exception(message[2]))
+            if path in failed:
+                files_state.pop(path, None)
+                return None
+            if path not in files_state:
+                files_state[path] = {"stored": ingest.get_stored_ids(collection, batch_size, source=path),
+                                     "seen": set(), "rows": 0, "embedded": 0}
+            state = files_state[path]
+            if kind == "done":
+                del files_state[path]
+                summary = {"rows": state["rows"], "chunks": len(state["seen"]), "embedded": state["embedded"]}
+                summary["parse_seconds"] = round(message[2], 3)
+                return ("done", path, state["stored"].difference(state["seen"]), summary)
+
+            # Diff the batch against what is stored for this file and keep only what changed
+            _, _, chunks, metadatas, n_rows = message
+            ids, documents, metadatas = ingest.make_chunk_records(chunks, metadatas)
+            new_positions = [i for i, chunk_id in enumerate(ids)
+                             if chunk_id not in state["stored"] and chunk_id not in state["seen"]]
+            state["seen"].update(ids)
+            state["rows"] += n_rows
+            state["embedded"] += len(new_positions)
+            if not new_positions:
+                return None
+            return ("batch", path, [ids[i] for i in new_positions], [documents[i] for i in new_positions],
+                    [metadatas[i] for i in new_positions])
+
+        def embed_stage(message):
+            kind, path = message[:2]
+            if path in failed:
+                return None
+            if kind == "done":
+                return message
+            _, _, ids, documents, metadatas = message
+            try:
+                embeddings = list(ingest.embed_chunks(documents, use_azure))
+            except Exception as e:
+                fail(path, e)
+                return None
+            return ("batch", path, ids, documents, embeddings, metadatas)
+
+        def store_stage(message):
+            kind, path = message[:2]
+            if path in failed:
+                return
+            try:
+                if kind == "batch":
+                    _, _, ids, documents, embeddings, metadatas = message
+                    ingest.upsert_in_batches(collection, ids, documents, embeddings, metadatas, batch_size)
+                    return
+                # All of the file's batches are stored, so its vanished chunks can go
+                _, _, vanished_ids, summary = message
+                ingest.delete_in_batches(collection, vanished_ids, batch_size)
+                manifest[path] = {**file_signature(path), **summary, "status": "done"}
+                save_manifest(manifest, manifest_path)
+            except Exception as e:
+                fail(path, e)
+                return
+            for key in totals:
+                totals[key] += summary[key]
+            progress.update(1)
+
+        # Workers block once queue_size batches are waiting, so parsed chunks cannot pile up in memory
+        batch_queue = multiprocessing.Queue(maxsize=queue_size)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(batch_queue,)) as pool:
+            futures = {pool.submit(parse_and_chunk_file, path): path for path in pending}
+            try:
+                timings = run_pipeline(
+                    iter_worker_messages(futures, batch_queue),
+                    [("diff", diff_stage), ("embed", embed_stage), ("store", store_stage)],
+                    source_name="parse",
+                    queue_size=queue_size
+                )
+            finally:
+                # If the pipeline stopped early, let the workers finish instead of blocking on a full queue
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        batch_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+    elapsed = time.perf_counter() - start_time
+    print_stage_timings(timings)
+    print(f"Ingested {len(pending) - len(errors)} files in {elapsed:.1f}s: "
+          f"{totals['rows'] / elapsed:,.0f} rows/s, {totals['chunks'] / elapsed:,.0f} chunks/s, "
+          f"{totals['embedded']} chunks embedded.")
+    for path, error in errors:
+        print(f"Failed: {path}: {error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory or glob of Excel/CSV/Parquet files into ChromaDB.")
+    parser.add_argument("paths", nargs="+", help="Files, directories or glob patterns to ingest.")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (defaults to the CPU count).")
+    parser.add_argument("--local", action="store_true", help="Use the local ONNX embedding model instead of Azure.")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH, help="Resume manifest path.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Records per upsert call.")
+    parser.add_argument("--force", action="store_true", help="Re-process files even if they are in the manifest.")
+    args = parser.parse_args()
+
+    ingest_files(
+        find_files(args.paths),
+        workers=args.workers,
+        use_azure=False if args.local else None,
+        manifest_path=args.manifest,
+        batch_size=args.batch_size,
+        force=args.force
+    )
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+
+# Maximum number of batches waiting between two stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+class StageStats:
+    """
+    Timings for one pipeline stage: time spent working, waiting for input and
+    blocked on a full output queue (backpressure).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wait_seconds": round(self.wait_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+        }
+
+def _put(out_queue, item, stats, stop):
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    stats.blocked_seconds += time.perf_counter() - start
+
+def _source_worker(source, out_queue, stats, stop, errors):
+    try:
+        iterator = iter(source)
+        while not stop.is_set():
+            start = time.perf_counter()
+            item = next(iterator, _DONE)
+            stats.busy_seconds += time.perf_counter() - start
+            if item is _DONE:
+                break
+            stats.items += 1
+            _put(out_queue, item, stats, stop)
+    except Exception as e:
+        errors.append((stats.name, e))
+        stop.set()
+    finally:
+        _put(out_queue, _DONE, stats, stop)
+
+def _stage_worker(fn, in_queue, out_queue, stats, stop, errors):
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                stats.wait_seconds += time.perf_counter() - start
+                continue
+            stats.wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+            result = fn(item)
+            stats.busy_seconds += time.perf_counter() - start
+            stats.items += 1
+            # Stages may return None to drop a batch (e.g. nothing changed)
+            if result is not None and out_queue is not None:
+                _put(out_queue, result, stats, stop)
+    except Exception as e:
+        errors.append((stats.name, e))
+        stop.set()
+    finally:
+        if out_queue is not None:
+            _put(out_queue, _DONE, stats, stop)
+
+def run_pipeline(source, stages, source_name="read", queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Run a source iterator and a list of (name, fn) stages concurrently, one thread per stage,
+    connected by bounded queues. Each stage's output is the next stage's input, and the last
+    stage's results are discarded. Returns per-stage timings keyed by stage name.
+    """
+    stop = threading.Event()
+    errors = []
+    stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    threads = [threading.Thread(target=_source_worker, args=(source, queues[0], stats[0], stop, errors),
+                                name=f"pipeline-{source_name}", daemon=True)]
+    for i, (name, fn) in enumerate(stages):
+        out_queue = queues[i + 1] if i + 1 < len(stages) else None
+        threads.append(threading.Thread(target=_stage_worker, args=(fn, queues[i], out_queue, stats[i + 1], stop, errors),
+                                        name=f"pipeline-{name}", daemon=True))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        stage_name, error = errors[0]
+        raise Exception(f"Pipeline stage '{stage_name}' failed: {error}") from error
+
+    timings = {stage.name: stage.as_dict() for stage in stats}
+    timings["total_seconds"] = round(elapsed, 3)
+    return timings
+
+def print_stage_timings(timings):
+    """
+    Print a per-stage breakdown; the stage with the most busy time is the bottleneck.
+    """
+    stages = {name: value for name, value in timings.items() if isinstance(value, dict)}
+    bottleneck = max(stages, key=lambda name: stages[name]["busy_seconds"])
+    print(f"Pipeline finished in {timings['total_seconds']:.2f}s")
+    print(f"{'stage':<8} {'items':>7} {'busy s':>9} {'wait s':>9} {'blocked s':>10}")
+    for name, stage in stages.items():
+        marker = "  <- bottleneck" if name == bottleneck else ""
+        print(f"{name:<8} {stage['items']:>7} {stage['busy_seconds']:>9.2f} "
+              f"{stage['wait_seconds']:>9.2f} {stage['blocked_seconds']:>10.2f}{marker}")
@@ -0,0 +1,175 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# Lexical (BM25) index configuration
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index.sqlite")  # Empty disables the index
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))  # Terms in more of the corpus than this are skipped
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+def tokenize(text):
+    """
+    Lower-case word tokens. Compound identifiers such as "ID-0001234" or "v2.1" are kept
+    whole and also split into their parts, so both exact codes and their pieces match.
+    """
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./:]", token) if part)
+    return tokens
+
+class LexicalIndex:
+    """
+    Persistent BM25 inverted index over chunk texts, stored in SQLite next to the ChromaDB
+    data and updated incrementally as chunks are upserted and deleted.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH, k1=BM25_K1, b=BM25_B, max_df_ratio=BM25_MAX_DF_RATIO):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self._stats = None  # (data_version, n_documents, average_length)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                chunk_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_chunk_id ON postings (chunk_id);
+            """
+        )
+        self._conn.commit()
+
+    def _corpus_stats(self):
+        # Counting every document per query is slow on large indexes, so the counts are cached
+        # until a commit from this or another connection changes the database
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._stats is None or self._stats[0] != data_version:
+            self._stats = (data_version, *self._conn.execute("SELECT COUNT(*), AVG(length) FROM documents").fetchone())
+        return self._stats[1], self._stats[2]
+
+    def _delete(self, ids):
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM documents WHERE chunk_id IN ({placeholders})", batch)
+
+    def add(self, ids, texts):
+        """
+        Index (or re-index) chunks by id.
+        """
+        documents, postings = [], []
+        for chunk_id, text in zip(ids, texts):
+            counts = Counter(tokenize(text))
+            documents.append((chunk_id, sum(counts.values())))
+            postings.extend((term, chunk_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._delete(list(ids))
+            self._conn.executemany("INSERT INTO documents (chunk_id, length) VALUES (?, ?)", documents)
+            self._conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+            self._conn.commit()
+            self._stats = None
+
+    def delete(self, ids):
+        """
+        Remove chunks from the index.
+        """
+        with self._lock:
+            self._delete(list(ids))
+            self._conn.commit()
+            self._stats = None
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+            self._stats = None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(self, query, top_k=5):
+        """
+        Return the top_k (chunk_id, BM25 score) pairs for a query, best first.
+
+        Terms found in more than max_df_ratio of all chunks carry almost no weight (idf below
+        log 2) but have the longest postings lists, so they are skipped unless the query has
+        nothing rarer.
+        """
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_documents, average_length = self._corpus_stats()
+            if not n_documents:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            document_frequencies = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                list(terms)
+            ).fetchall())
+            if not document_frequencies:
+                return []
+
+            rare_terms = {term for term, df in document_frequencies.items() if df <= self.max_df_ratio * n_documents}
+            weights = [
+                (term, terms[term] * math.log(1 + (n_documents - df + 0.5) / (df + 0.5)))
+                for term, df in document_frequencies.items()
+                if term in rare_terms or not rare_terms
+            ]
+            # Sum the BM25 contributions per chunk inside SQLite instead of row by row in Python
+            return self._conn.execute(
+                f"""
+                WITH weights (term, weight) AS (VALUES {", ".join(["(?, ?)"] * len(weights))})
+                SELECT p.chunk_id, SUM(w.weight * p.tf * (? + 1) / (p.tf + ? * (1 - ? + ? * d.length / ?))) AS score
+                FROM weights w
+                JOIN postings p ON p.term = w.term
+                JOIN documents d ON d.chunk_id = p.chunk_id
+                GROUP BY p.chunk_id
+                ORDER BY score DESC
+                LIMIT ?
+                """,
+                [value for weight in weights for value in weight]
+                + [self.k1, self.k1, self.b, self.b, average_length, top_k]
+            ).fetchall()
+
+    def search_many(self, queries, top_k=5):
+        return [self.search(query, top_k) for query in queries]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def reciprocal_rank_fusion(rankings, top_k=5, k=RRF_K):
+    """
+    Fuse several ranked lists of ids into one: each id scores sum(1 / (k + rank)) over
+    the lists it appears in. Returns the top_k (id, score) pairs, best first.
+    """
+    scores = Counter()
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
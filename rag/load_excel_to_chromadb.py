@@ -1,13 +1,24 @@
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import time
+import hashlib
+import threading
 import chromadb
 from chromadb import Client
 from chromadb.config import Settings
-from chromadb.utils import embedding_functions
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 from azure.core.credentials import AzureKeyCredential
 from tqdm import tqdm  # Import tqdm for progress bar
+from embedding_engine import EmbeddingEngine
+from embedding_cache import EmbeddingCache
+from local_embeddings import LocalEmbedder, get_local_embedder
+from stream_reader import existing_columns, iter_row_batches, source_metadata
+from chunking import (CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, INGEST_METADATA_COLUMNS, chunk_row_batch, chunk_rows,
+                      combine_columns)
+from ingest_pipeline import PIPELINE_QUEUE_SIZE, run_pipeline, print_stage_timings
+from lexical_index import LEXICAL_INDEX_PATH, LexicalIndex
+from collection_version import bump_collection_version
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,12 +29,9 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
 
-# Initialize Azure OpenAI client
-azure_openai_client = AzureOpenAI(
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_API_KEY
-)
+# "azure" or "local" (offline ONNX model); queries must use the same backend
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "azure")
+USE_AZURE_EMBEDDINGS = EMBEDDING_BACKEND != "local"
 
 # # Initialize ChromaDB client
 # chroma_client = Client(Settings(
@@ -31,115 +39,313 @@ azure_openai_client = AzureOpenAI(
 #     chroma_db_impl="duckdb+parquet"
 # ))
 
-CHROMA_DATA_PATH = "./chromadb"  # Path to the ChromaDB data directory
+CHROMA_DATA_PATH = os.getenv("CHROMA_DATA_PATH", "./chromadb")  # Path to the ChromaDB data directory
 chroma_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
 
-def load_excel_file():
+# Persistent embedding cache, so re-ingestion only embeds new or changed chunks
+embedding_cache = EmbeddingCache()
+
+# BM25 index for hybrid retrieval, kept in step with every upsert and delete (disabled if the path is empty)
+lexical_index = LexicalIndex(LEXICAL_INDEX_PATH) if LEXICAL_INDEX_PATH else None
+
+# Number of chunks sent per upsert call (defaults to the client's max batch size)
+CHROMA_UPSERT_BATCH_SIZE = os.getenv("CHROMA_UPSERT_BATCH_SIZE")
+
+# "sync" updates the collection in place, "reset" drops and rebuilds it
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+
+# Optional cap on the number of source rows to ingest (useful for quick test runs)
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS")) if os.getenv("INGEST_MAX_ROWS") else None
+
+def get_excel_file_name():
     """
-    Load the Excel file specified in the .env file.
+    Get the source file name specified in the .env file.
     """
-    # Get the file name from the .env file
     file_name = os.getenv("EXCEL_FILE_NAME")
     
     if not file_name:
         raise ValueError("EXCEL_FILE_NAME is not set in the .env file.")
-    
-    # Read the Excel file
-    try:
-        # data = pd.read_excel(file_name)
-        data = pd.read_excel(file_name).head(20)
+    return file_name
 
-        return data  # Return the DataFrame
-    except FileNotFoundError:
-        raise FileNotFoundError(f"The file '{file_name}' was not found in the current folder.")
-    except Exception as e:
-        raise Exception(f"An error occurred: {e}")
+def stream_excel_file(columns=None, max_rows=INGEST_MAX_ROWS):
+    """
+    Stream the Excel/CSV/Parquet file specified in the .env file as bounded row batches.
+    """
+    return iter_row_batches(get_excel_file_name(), columns=columns, max_rows=max_rows)
 
-def chunk_text(data, chunk_size=500):
+def chunk_text(data, chunk_size=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
     """
     Chunk the text data into smaller pieces for efficient retrieval.
+    Chunks are sized in tokens and never span more than one row.
     """
-    combined_text = " ".join(data.astype(str).fillna("").apply(" ".join, axis=1))
-    chunks = [combined_text[i:i+chunk_size] for i in range(0, len(combined_text), chunk_size)]
+    chunks, _ = chunk_rows(combine_columns(data), chunk_tokens=chunk_size, overlap_tokens=overlap)
     return chunks
 
+_azure_engine = None
+_azure_engine_lock = threading.Lock()
+
+def get_azure_embedding_engine():
+    """
+    Return the process-wide EmbeddingEngine for Azure OpenAI, creating its async client on
+    first use. Keeping one engine means the adaptive concurrency limit and any Retry-After
+    cool-down carry over from one embedding call to the next.
+    """
+    global _azure_engine
+    with _azure_engine_lock:
+        if _azure_engine is None:
+            # Retries are handled by the embedding engine so it can adapt to rate limits
+            client = AsyncAzureOpenAI(
+                api_version=AZURE_OPENAI_API_VERSION,
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                max_retries=0
+            )
+
+            async def embed_batch(batch):
+                response = await client.embeddings.create(
+                    input=batch,
+                    model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
+                )
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+            _azure_engine = EmbeddingEngine(embed_batch)
+        return _azure_engine
+
+async def embed_texts_azure_async(texts):
+    """
+    Generate embeddings for a list of texts with concurrent, token-bounded Azure OpenAI requests.
+    Must run on the engine's event loop (see EmbeddingEngine.run), which owns the client.
+    """
+    engine = get_azure_embedding_engine()
+    embeddings = await engine.aembed(texts)
+    print(f"Azure OpenAI embedding stats: {engine.stats}")
+    return embeddings
+
 def embed_texts_azure(texts):
     """
     Generate embeddings for a list of texts using Azure OpenAI's API.
     """
     try:
-        response = azure_openai_client.embeddings.create(
-            input=texts,  # Pass the entire list of texts
-            model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
+        return embedding_cache.embed(
+            AZURE_OPENAI_DEPLOYMENT_NAME,
+            texts,
+            lambda missing: get_azure_embedding_engine().run(embed_texts_azure_async(missing))
         )
-        # Extract embeddings from the response
-        embeddings = [item.embedding for item in response.data]
-        return embeddings
     except Exception as e:
         raise Exception(f"Azure OpenAI API error: {e}")
     
 def embed_texts_chromadb(texts):
     """
-    Generate embeddings for a list of texts using ChromaDB's innate embedding function.
+    Generate embeddings for a list of texts with the local ONNX model behind ChromaDB's
+    default embedding function, kept loaded between calls.
     """
-    print("Using ChromaDB's innate embedding function...")
+    print("Using the local ONNX embedding model...")
     try:
-        # Initialize ChromaDB's embedding function
-        embedding_function = embedding_functions.DefaultEmbeddingFunction()
-
-        # Generate embeddings for all texts
-        embeddings = embedding_function(texts)
-        return embeddings
+        embedder = get_local_embedder()
+        return embedding_cache.embed(LocalEmbedder.MODEL_NAME, texts, embedder)
     except Exception as e:
-        raise Exception(f"ChromaDB embedding error: {e}")
+        raise Exception(f"Local embedding error: {e}")
 
-def store_chunks_in_chromadb(chunks, use_azure=True):
+def get_upsert_batch_size(batch_size=None):
     """
-    Store text chunks and their embeddings in ChromaDB.
+    Resolve the number of records written per upsert call, capped at the client's max batch size.
     """
-    # Create a collection in ChromaDB
-    collection_name = "genie_text_metadata"
+    try:
+        max_batch_size = chroma_client.get_max_batch_size()
+    except AttributeError:
+        # Older ChromaDB clients expose the limit as a property
+        max_batch_size = chroma_client.max_batch_size
+
+    if batch_size is None:
+        return max_batch_size
+    return max(1, min(int(batch_size), max_batch_size))
+
+def upsert_in_batches(collection, ids, documents, embeddings, metadatas, batch_size=None):
+    """
+    Upsert records into a ChromaDB collection in bulk, one call per batch.
+    Returns the throughput in rows per second.
+    """
+    batch_size = get_upsert_batch_size(batch_size)
+    start_time = time.perf_counter()
+
+    for start in tqdm(range(0, len(ids), batch_size), unit="batch"):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            documents=documents[start:end],
+            embeddings=embeddings[start:end],
+            metadatas=metadatas[start:end]
+        )
+        if lexical_index is not None:
+            lexical_index.add(ids[start:end], documents[start:end])
+    if ids:
+        # Tells long-running retrievers (the numpy engine) to rebuild their snapshot
+        bump_collection_version(CHROMA_DATA_PATH, collection.name)
+
+    elapsed = time.perf_counter() - start_time
+    rows_per_second = len(ids) / elapsed if elapsed > 0 else float("inf")
+    print(f"Upserted {len(ids)} rows in {elapsed:.2f}s "
+          f"({rows_per_second:,.0f} rows/s, batch size {batch_size}).")
+    return rows_per_second
+
+def make_chunk_id(text, source="", row=""):
+    """
+    Compute a stable chunk id from the chunk's source, source row and content.
+    """
+    digest = hashlib.sha1(f"{source}\x1f{row}\x1f{text}".encode("utf-8")).hexdigest()
+    return f"chunk_{digest}"
+
+def make_chunk_records(chunks, metadatas=None):
+    """
+    Build stable ids and metadata for a list of chunks, dropping exact duplicates.
+    """
+    if metadatas is None:
+        metadatas = [{"chunk_id": i} for i in range(len(chunks))]
 
-    # Check if the collection exists and delete it to reset
+    records = {}
+    for i, (chunk, metadata) in enumerate(zip(chunks, metadatas)):
+        chunk_id = make_chunk_id(chunk, metadata.get("source", ""), metadata.get("row", i))
+        records.setdefault(chunk_id, (chunk, metadata))
+
+    ids = list(records)
+    documents = [records[chunk_id][0] for chunk_id in ids]
+    metadatas = [records[chunk_id][1] for chunk_id in ids]
+    return ids, documents, metadatas
+
+def embed_chunks(chunks, use_azure=USE_AZURE_EMBEDDINGS):
+    """
+    Generate embeddings for a list of chunks with the selected backend.
+    """
+    if use_azure:
+        embeddings = embed_texts_azure(chunks)
+    else:
+        embeddings = embed_texts_chromadb(chunks)
+    print(f"Embedding cache stats: {embedding_cache.stats}")
+    return embeddings
+
+def get_stored_ids(collection, batch_size=None, source=None):
+    """
+    Fetch the ids of all records currently stored in a collection, page by page.
+    If a source is given, only ids of chunks from that source are returned.
+    """
+    batch_size = get_upsert_batch_size(batch_size)
+    where = {"source": source} if source is not None else None
+    stored_ids = set()
+    offset = 0
+    while True:
+        result = collection.get(where=where, include=[], limit=batch_size, offset=offset)
+        stored_ids.update(result["ids"])
+        if len(result["ids"]) < batch_size:
+            return stored_ids
+        offset += batch_size
+
+def delete_in_batches(collection, ids, batch_size=None):
+    """
+    Delete records from a ChromaDB collection in bulk, one call per batch.
+    """
+    ids = list(ids)
+    batch_size = get_upsert_batch_size(batch_size)
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start:start + batch_size])
+        if lexical_index is not None:
+            lexical_index.delete(ids[start:start + batch_size])
+    if ids:
+        bump_collection_version(CHROMA_DATA_PATH, collection.name)
+
+def reset_collection(collection_name="genie_text_metadata"):
+    """
+    Delete a collection if it exists so it can be rebuilt from scratch.
+    """
     if collection_name in chroma_client.list_collections():
         print(f"Collection '{collection_name}' exists. Resetting it...")
         chroma_client.delete_collection(name=collection_name)
-        
+        if lexical_index is not None:
+            lexical_index.clear()
+        bump_collection_version(CHROMA_DATA_PATH, collection_name)
+
+def sync_chunk_batches(chunk_batches, use_azure=USE_AZURE_EMBEDDINGS, batch_size=CHROMA_UPSERT_BATCH_SIZE, source=None,
+                       chunker=None, queue_size=PIPELINE_QUEUE_SIZE, delete_vanished=True):
+    """
+    Incrementally sync a stream of (chunks, metadatas) batches into ChromaDB.
+    Only new or changed chunks are embedded and upserted, and only vanished chunks are deleted.
+    If a source is given, chunks of other sources are left untouched. When the batches
+    cover only part of the source (delete_vanished=False), nothing is deleted.
+
+    Reading, chunking, embedding and storing run as concurrent pipeline stages connected by
+    bounded queues. If a chunker is given, chunk_batches are raw row batches and chunking
+    runs as its own stage. Returns the sync counts and per-stage timings.
+    """
+    collection_name = "genie_text_metadata"
     collection = chroma_client.get_or_create_collection(
         name=collection_name
     )
 
-    # Generate embeddings for all chunks at once
-    print("Generating embeddings for all chunks...")
-    if use_azure:
-        embeddings = embed_texts_azure(chunks)
-    else:
-        embeddings = embed_texts_chromadb(chunks)
+    # Diff the incoming chunk ids against what is already stored, one batch at a time
+    stored_ids = get_stored_ids(collection, batch_size, source)
+    seen_ids = set()
+    counts = {"new": 0}
 
-    # Add chunks and their embeddings to the collection
-    print("Storing chunks and embeddings in ChromaDB...")
-    for i, (chunk, embedding) in tqdm(enumerate(zip(chunks, embeddings))):
-        collection.add(
-            documents=[chunk],
-            metadatas=[{"chunk_id": i}],
-            ids=[f"chunk_{i}"],
-            embeddings=[embedding]
-        )
-    print(f"Stored {len(chunks)} chunks in ChromaDB.")
+    def diff_stage(batch):
+        chunks, metadatas = batch
+        ids, documents, metadatas = make_chunk_records(chunks, metadatas)
+        new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in stored_ids and chunk_id not in seen_ids]
+        seen_ids.update(ids)
+        if not new_positions:
+            return None
+        return ([ids[i] for i in new_positions],
+                [documents[i] for i in new_positions],
+                [metadatas[i] for i in new_positions])
+
+    def embed_stage(batch):
+        ids, documents, metadatas = batch
+        print(f"Generating embeddings for {len(ids)} new or changed chunks...")
+        return ids, documents, list(embed_chunks(documents, use_azure)), metadatas
+
+    def store_stage(batch):
+        ids, documents, embeddings, metadatas = batch
+        upsert_in_batches(collection, ids, documents, embeddings, metadatas, batch_size)
+        counts["new"] += len(ids)
+
+    stages = [("diff", diff_stage), ("embed", embed_stage), ("store", store_stage)]
+    if chunker is not None:
+        stages.insert(0, ("chunk", chunker))
+    timings = run_pipeline(chunk_batches, stages, queue_size=queue_size)
+
+    # Delete vanished chunks only after their replacements are stored
+    vanished_ids = stored_ids.difference(seen_ids) if delete_vanished else set()
+    delete_in_batches(collection, vanished_ids, batch_size)
+
+    summary = {
+        "new": counts["new"],
+        "vanished": len(vanished_ids),
+        "unchanged": len(seen_ids) - counts["new"],
+        "stage_timings": timings,
+    }
+    print(f"Sync summary: {summary['new']} new or changed, {summary['vanished']} vanished, "
+          f"{summary['unchanged']} unchanged.")
+    print_stage_timings(timings)
+    print(f"Synced {len(seen_ids)} chunks in ChromaDB.")
+    return summary
 
 if __name__ == "__main__":
     try:
-        # Load the Excel file
-        df = load_excel_file()
-        print("File loaded successfully!")
+        # Stream the Excel file in bounded row batches
+        source = os.path.abspath(get_excel_file_name())  # The same form ingest_files records
+        row_batches = stream_excel_file(columns=["doc_text", *existing_columns(source, INGEST_METADATA_COLUMNS)])
+        metadata = source_metadata(source)  # File name, sheet and ingest time, for filtered queries
 
-        # Chunk the data
-        # chunks = chunk_text(df)
-        chunks = chunk_text(df[['doc_text']])
-        print(f"Data chunked into {len(chunks)} pieces.")
-
-        # Store chunks in ChromaDB
-        store_chunks_in_chromadb(chunks)
+        # Read, chunk, embed and store batches concurrently
+        if INGEST_MODE == "reset":
+            reset_collection()
+        if INGEST_MAX_ROWS is not None and INGEST_MODE != "reset":
+            # Rows past the cap were not read, so their stored chunks must not count as vanished
+            print(f"INGEST_MAX_ROWS={INGEST_MAX_ROWS}: syncing the first rows only, no chunks will be deleted.")
+        sync_chunk_batches(
+            row_batches,
+            source=source,
+            chunker=lambda rows: chunk_row_batch(rows, source=source, metadata=metadata),
+            delete_vanished=INGEST_MAX_ROWS is None
+        )
         print("Chunks stored in ChromaDB successfully!")
     except Exception as e:
         print(e)
\ No newline at end of file
@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+# Local embedding configuration
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "1"))  # Concurrent inference calls
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))  # Intra-op threads per call, 0 = all cores
+
+class LocalEmbedder:
+    """
+    Offline all-MiniLM-L6-v2 embedder running on ONNX Runtime.
+
+    Uses the same model files as ChromaDB's DefaultEmbeddingFunction, so vectors are
+    interchangeable with it, but loads the session once, pads each batch only to its
+    longest input (inputs are sorted by length first) and spreads batches over a
+    configurable number of workers and intra-op threads.
+    """
+
+    MODEL_NAME = ONNXMiniLM_L6_V2.MODEL_NAME
+    MAX_TOKENS = 256
+
+    def __init__(self, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, workers=LOCAL_EMBEDDING_WORKERS,
+                 intra_op_threads=LOCAL_EMBEDDING_THREADS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        # Reuse ChromaDB's download and cache location for the model files
+        base = ONNXMiniLM_L6_V2()
+        base._download_model_if_not_exists()
+        model_dir = os.path.join(base.DOWNLOAD_PATH, base.EXTRACTED_FOLDER_NAME)
+
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.MAX_TOKENS)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")  # Pad to the longest input in each batch
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.log_severity_level = 3
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads <= 0 and self.workers > 1:
+            # Split the cores between workers instead of oversubscribing them
+            intra_op_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        if intra_op_threads > 0:
+            session_options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            providers=["CPUExecutionProvider"],
+            sess_options=session_options
+        )
+        self._pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        last_hidden_state = self.session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        })[0]
+
+        # Mean pooling over real tokens, then L2 normalisation
+        mask = attention_mask[:, :, np.newaxis].astype(np.float32)
+        embeddings = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1e-12
+        return (embeddings / norms).astype(np.float32)
+
+    def embed(self, texts):
+        """
+        Embed a list of texts and return a float32 array of shape (len(texts), dim) in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Group inputs of similar length so little compute is spent on padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        def run(positions):
+            return self._embed_batch([texts[i] for i in positions])
+
+        results = list(self._pool.map(run, batches) if self._pool else map(run, batches))
+        embeddings = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for positions, batch_embeddings in zip(batches, results):
+            embeddings[positions] = batch_embeddings
+        return embeddings
+
+    def __call__(self, texts):
+        return [embedding.tolist() for embedding in self.embed(texts)]
+
+_local_embedder = None
+_local_embedder_lock = threading.Lock()
+
+def get_local_embedder():
+    """
+    Return the process-wide LocalEmbedder, loading the model on first use.
+    """
+    global _local_embedder
+    with _local_embedder_lock:
+        if _local_embedder is None:
+            _local_embedder = LocalEmbedder()
+        return _local_embedder
@@ -0,0 +1,172 @@
+import datetime
+import re
+
+import numpy as np
+
+# Filter expressions: comparisons of a metadata field with a value, joined by and/or, e.g.
+#   file_name == "sales.xlsx" and row >= 100 and row < 200
+#   sheet in ["2023", "2024"] or (ingested_at >= "2024-06-01" and source != "old.csv")
+FILTER_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.-]))
+      | (?P<operator>==|!=|>=|<=|=|>|<)
+      | (?P<punctuation>[()\[\],])
+      | (?P<word>[A-Za-z_][\w.]*)
+    )""", re.VERBOSE)
+OPERATORS = {"==": "$eq", "=": "$eq", "!=": "$ne", ">": "$gt", ">=": "$gte", "<": "$lt", "<=": "$lte"}
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?")
+
+def tokenize_filter(expression):
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = FILTER_TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid filter expression at position {position}: {expression[position:]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            tokens.append(("value", re.sub(r"\\(.)", r"\1", text[1:-1])))
+        elif kind == "number":
+            tokens.append(("value", float(text) if any(c in text for c in ".eE") else int(text)))
+        elif kind == "word" and text in ("true", "false", "True", "False"):
+            tokens.append(("value", text.lower() == "true"))
+        elif kind == "word" and text.lower() in ("and", "or", "not", "in"):
+            tokens.append((text.lower(), text))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+def to_timestamp(value):
+    """
+    Unix seconds for an ISO date or date-time string, matching how ingestion stores dates.
+    """
+    timestamp = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return int(timestamp.timestamp())
+
+class FilterParser:
+    """
+    Recursive-descent parser from a filter expression to a ChromaDB where clause.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize_filter(expression)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if token[0] is None or (kind is not None and token[0] != kind) or (text is not None and token[1] != text):
+            expected = text or kind or "more input"
+            raise ValueError(f"Invalid filter expression {self.expression!r}: expected {expected}, got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        where = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Invalid filter expression {self.expression!r}: unexpected {self.peek()[1]!r}")
+        return where
+
+    def parse_or(self):
+        clauses = [self.parse_and()]
+        while self.peek()[0] == "or":
+            self.take()
+            clauses.append(self.parse_and())
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    def parse_and(self):
+        clauses = [self.parse_term()]
+        while self.peek()[0] == "and":
+            self.take()
+            clauses.append(self.parse_term())
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def parse_term(self):
+        if self.peek() == ("punctuation", "("):
+            self.take()
+            where = self.parse_or()
+            self.take("punctuation", ")")
+            return where
+
+        field = self.take("word")[1]
+        kind, text = self.peek()
+        if kind in ("in", "not"):
+            self.take()
+            if kind == "not":
+                self.take("in")
+            return {field: {"$nin" if kind == "not" else "$in": self.parse_list()}}
+
+        operator = OPERATORS[self.take("operator")[1]]
+        value = self.take("value")[1]
+        # Range comparisons only work on numbers, and dates are stored as Unix seconds
+        if operator in RANGE_OPERATORS and isinstance(value, str) and ISO_DATE.fullmatch(value):
+            value = to_timestamp(value)
+        return {field: {operator: value}}
+
+    def parse_list(self):
+        self.take("punctuation", "[")
+        values = []
+        while self.peek() != ("punctuation", "]"):
+            if values:
+                self.take("punctuation", ",")
+            values.append(self.take("value")[1])
+        self.take("punctuation", "]")
+        if not values:
+            raise ValueError(f"Invalid filter expression {self.expression!r}: empty list")
+        return values
+
+def parse_filter(filters):
+    """
+    Turn a filter expression string into a ChromaDB where clause. Dicts are taken to be
+    where clauses already and returned unchanged; None or an empty string means no filter.
+    """
+    if filters is None or isinstance(filters, dict):
+        return filters or None
+    if not filters.strip():
+        return None
+    return FilterParser(filters).parse()
+
+def where_mask(where, column):
+    """
+    Evaluate a where clause against columnar metadata: column(field) returns an object array
+    with each row's value (None where the field is missing). Returns a boolean row mask.
+    Like ChromaDB, a row without the field never matches a comparison on it.
+    """
+    if "$and" in where or "$or" in where:
+        operator, clauses = next(iter(where.items()))
+        masks = [where_mask(clause, column) for clause in clauses]
+        return np.logical_and.reduce(masks) if operator == "$and" else np.logical_or.reduce(masks)
+    if len(where) > 1:
+        return where_mask({"$and": [{field: condition} for field, condition in where.items()]}, column)
+
+    field, condition = next(iter(where.items()))
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    operator, value = next(iter(condition.items()))
+    values = column(field)
+    present = values != None  # noqa: E711 (element-wise on an object array)
+
+    if operator in ("$in", "$nin"):
+        found = np.frompyfunc(set(value).__contains__, 1, 1)(values).astype(bool)
+        return present & (found if operator == "$in" else ~found)
+    if operator in ("$eq", "$ne"):
+        equal = (values == value).astype(bool)
+        return present & (equal if operator == "$eq" else ~equal)
+    if operator in RANGE_OPERATORS:
+        numbers = np.frompyfunc(as_number, 1, 1)(values).astype(np.float64)
+        with np.errstate(invalid="ignore"):
+            return {"$gt": numbers > value, "$gte": numbers >= value,
+                    "$lt": numbers < value, "$lte": numbers <= value}[operator]
+    raise ValueError(f"Unsupported filter operator '{operator}'")
+
+def as_number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# NumPy index configuration
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "")  # Directory of a saved index, memory-mapped when set
+NUMPY_INDEX_DEFAULT_PATH = "./numpy_index"  # Used for quantised indexes when NUMPY_INDEX_PATH is not set
+NUMPY_INDEX_LOAD_BATCH_SIZE = int(os.getenv("NUMPY_INDEX_LOAD_BATCH_SIZE", "10000"))
+NUMPY_INDEX_QUERY_BLOCK = 64  # Queries scored per matrix product, bounds the score matrix size
+NUMPY_INDEX_QUANTIZATION = os.getenv("NUMPY_INDEX_QUANTIZATION", "none")  # "none", "int8" or "pq"
+NUMPY_INDEX_PQ_SUBSPACES = int(os.getenv("NUMPY_INDEX_PQ_SUBSPACES", "48"))  # Bytes per vector with "pq"
+NUMPY_INDEX_RERANK = int(os.getenv("NUMPY_INDEX_RERANK", "4"))  # Candidates per result rescored at full precision
+NUMPY_INDEX_FILTER_CACHE = int(os.getenv("NUMPY_INDEX_FILTER_CACHE", "64"))  # Row masks kept for repeated filters
+
+def normalize_rows(matrix):
+    """
+    Scale each row to unit length so a dot product is the cosine similarity.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def top_k_rows(scores, k):
+    """
+    Column positions and scores of the k highest scores in each row, best first.
+    """
+    # argpartition finds the top k in linear time; only those k are then sorted
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+class NumpyIndex:
+    """
+    Exact in-memory vector index: every embedding in one contiguous, pre-normalised float32
+    matrix, searched with a matrix product and argpartition.
+
+    Results use ChromaDB's query result layout, with cosine distance (1 - similarity), so
+    the index can stand in for collection.query.
+
+    Optionally the matrix is quantised (int8 or product quantisation): the compact codes
+    are kept in memory and scanned for top_k * rerank candidates, which are then rescored
+    against the full-precision rows. When the index is loaded from disk those rows stay
+    memory-mapped, so only the rows of candidates are ever read.
+
+    Searches can be restricted with a ChromaDB-style where clause. The filter is applied
+    before scoring: metadata fields are held as columns, the matching rows are selected
+    once per call (and cached per filter), and only those rows are scored.
+    """
+
+    def __init__(self, ids, embeddings, documents, metadatas, quantizer=None, codes=None,
+                 rerank=NUMPY_INDEX_RERANK, version=None):
+        self.ids = ids
+        self.embeddings = embeddings
+        self.documents = documents
+        self.metadatas = metadatas
+        self.quantizer = quantizer
+        self.codes = codes
+        self.rerank = rerank
+        self.version = version  # Collection change marker the index was built at (see collection_version)
+        self._columns = {}  # Metadata field -> object array of per-row values
+        self._masks = OrderedDict()  # Filter -> matching row positions, least recently used first
+
+    def quantize(self, kind, **options):
+        """
+        Train a quantizer of the given kind ("int8" or "pq") on the matrix and encode every row.
+        """
+        from quantization import make_quantizer
+        if kind == "pq":
+            options.setdefault("subspaces", NUMPY_INDEX_PQ_SUBSPACES)
+        self.quantizer = make_quantizer(kind, **options).fit(self.embeddings)
+        self.codes = self.quantizer.encode(self.embeddings)
+        return self
+
+    def column(self, field):
+        """
+        Every row's value of a metadata field (None where missing), built on first use.
+        """
+        if field not in self._columns:
+            values = np.empty(len(self), dtype=object)
+            values[:] = [metadata.get(field) if metadata else None for metadata in self.metadatas]
+            self._columns[field] = values
+        return self._columns[field]
+
+    def filter_rows(self, where):
+        """
+        Sorted positions of the rows matching a where clause.
+        """
+        from metadata_filter import where_mask
+
+        key = json.dumps(where, sort_keys=True)
+        if key in self._masks:
+            self._masks.move_to_end(key)
+            return self._masks[key]
+        rows = np.flatnonzero(where_mask(where, self.column))
+        self._masks[key] = rows
+        if len(self._masks) > NUMPY_INDEX_FILTER_CACHE:
+            self._masks.popitem(last=False)
+        return rows
+
+    @property
+    def memory_bytes(self):
+        """
+        Bytes of vectors held in process memory: the codes and quantizer tables when
+        quantised, plus the full-precision matrix unless it is memory-mapped.
+        """
+        total = 0 if self.memory_mapped else self.embeddings.nbytes
+        if self.codes is not None:
+            total += self.codes.nbytes + sum(array.nbytes for array in self.quantizer.to_arrays().values())
+        return total
+
+    @property
+    def mapped_bytes(self):
+        """
+        Bytes of the full-precision matrix left on disk and paged in by the OS on access.
+        """
+        return self.embeddings.nbytes if self.memory_mapped else 0
+
+    @property
+    def memory_mapped(self):
+        return isinstance(self.embeddings, np.memmap)
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=NUMPY_INDEX_LOAD_BATCH_SIZE, path=None):
+        """
+        Load every record of a ChromaDB collection, paging through it in batches. With a
+        path the matrix is written page by page into a memory-mapped file there (which
+        save then moves into place), so it is never held in memory in full.
+        """
+        total = collection.count()
+        ids, documents, metadatas = [], [], []
+        embeddings = None
+        build_path = os.path.join(path, "embeddings.npy.tmp") if path else None
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            batch_embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                shape = (total, batch_embeddings.shape[1])
+                if build_path:
+                    os.makedirs(path, exist_ok=True)
+                    embeddings = np.lib.format.open_memmap(build_path, mode="w+", dtype=np.float32, shape=shape)
+                else:
+                    embeddings = np.empty(shape, dtype=np.float32)
+            embeddings[len(ids):len(ids) + len(batch_embeddings)] = normalize_rows(batch_embeddings)
+            ids.extend(batch["ids"])
+            documents.extend(batch["documents"])
+            metadatas.extend(batch["metadatas"])
+        if embeddings is None:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        elif build_path and len(ids) < total:
+            # Records were deleted while paging: copy the filled rows into a file of the right size
+            trimmed = np.lib.format.open_memmap(f"{build_path}.trim", mode="w+", dtype=np.float32,
+                                                shape=(len(ids), embeddings.shape[1]))
+            for start in range(0, len(ids), batch_size):
+                trimmed[start:start + batch_size] = embeddings[start:min(start + batch_size, len(ids))]
+            trimmed.flush()
+            del embeddings, trimmed
+            os.replace(f"{build_path}.trim", build_path)
+            embeddings = np.lib.format.open_memmap(build_path, mode="r+")
+        return cls(ids, embeddings[:len(ids)], documents, metadatas)
+
+    def save(self, path):
+        """
+        Write the index to a directory: the matrix as .npy (memory-mappable) and the records as JSON.
+        """
+        os.makedirs(path, exist_ok=True)
+        # Write to temporary files and rename, so a process that has the old matrix mapped keeps a valid file
+        embeddings_path = os.path.join(path, "embeddings.npy")
+        if self.memory_mapped and self.embeddings.filename == os.path.abspath(f"{embeddings_path}.tmp"):
+            self.embeddings.flush()  # Already written in place by from_collection
+        else:
+            with open(f"{embeddings_path}.tmp", "wb") as f:
+                np.save(f, self.embeddings)
+        records_path = os.path.join(path, "records.json")
+        with open(f"{records_path}.tmp", "w") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas,
+                       "version": self.version}, f)
+        os.replace(f"{embeddings_path}.tmp", embeddings_path)
+        os.replace(f"{records_path}.tmp", records_path)
+
+        codes_path = os.path.join(path, "codes.npz")
+        if self.quantizer is not None:
+            with open(f"{codes_path}.tmp", "wb") as f:
+                np.savez(f, kind=self.quantizer.kind, codes=self.codes, **self.quantizer.to_arrays())
+            os.replace(f"{codes_path}.tmp", codes_path)
+        elif os.path.exists(codes_path):
+            os.remove(codes_path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a saved index. With mmap the matrix stays on disk and is paged in by the OS.
+        """
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        with open(os.path.join(path, "records.json")) as f:
+            records = json.load(f)
+
+        quantizer, codes = None, None
+        codes_path = os.path.join(path, "codes.npz")
+        if os.path.exists(codes_path):
+            from quantization import QUANTIZERS
+            with np.load(codes_path) as arrays:
+                quantizer = QUANTIZERS[str(arrays["kind"])].from_arrays(arrays)
+                codes = arrays["codes"]  # Codes are scanned on every query, so they are held in memory
+        return cls(records["ids"], embeddings, records["documents"], records["metadatas"], quantizer, codes,
+                   version=records.get("version"))
+
+    @classmethod
+    def open(cls, collection, path=NUMPY_INDEX_PATH, rebuild=False, quantization=NUMPY_INDEX_QUANTIZATION,
+             version=None):
+        """
+        Load the saved index at path if there is one, otherwise (or with rebuild) build it
+        from the collection and save it to path, if given, for the next start. The index is
+        (re)quantised if it does not match the requested quantization. A built index records
+        version, the collection's change marker read before its records were.
+
+        A quantised index always lives on disk (at NUMPY_INDEX_DEFAULT_PATH if no path is
+        given), so only its codes are held in memory and the full-precision rows are mapped.
+        """
+        if quantization != "none" and not path:
+            path = NUMPY_INDEX_DEFAULT_PATH
+        if path and not rebuild and os.path.exists(os.path.join(path, "embeddings.npy")):
+            index = cls.load(path)
+            if (index.quantizer.kind if index.quantizer else "none") == quantization:
+                return index
+        else:
+            index = cls.from_collection(collection, path=path)
+            index.version = version
+
+        if quantization != "none":
+            index.quantize(quantization)
+        else:
+            index.quantizer, index.codes = None, None
+        if path:
+            index.save(path)
+            # Reload so the full-precision matrix is memory-mapped instead of held in memory
+            index = cls.load(path)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query_embeddings, top_k=5, where=None):
+        """
+        Return (positions, similarities) of the top_k rows for each query, best first.
+        With a where clause only matching rows are scored, and fewer than top_k may be returned.
+        """
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        rows = self.filter_rows(where) if where else None
+        n_rows = len(self) if rows is None else len(rows)
+        k = min(top_k, n_rows)
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        # Pre-filter: gather the matching rows (or their codes) once and search only those
+        embeddings, codes = self.embeddings, self.codes
+        if rows is not None:
+            if self.quantizer is None:
+                embeddings = np.asarray(self.embeddings[rows], dtype=np.float32)
+            else:
+                codes = self.quantizer.select(self.codes, rows)
+
+        positions = np.empty((len(queries), k), dtype=np.int64)
+        similarities = np.empty((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), NUMPY_INDEX_QUERY_BLOCK):
+            block = queries[start:start + NUMPY_INDEX_QUERY_BLOCK]
+            if self.quantizer is None:
+                top, top_scores = top_k_rows(block @ embeddings.T, k)
+                if rows is not None:
+                    top = rows[top]
+            else:
+                candidates = min(n_rows, k * max(1, self.rerank))
+                top, top_scores = top_k_rows(self.quantizer.score(codes, block), candidates)
+                if rows is not None:
+                    top = rows[top]
+                if self.rerank > 1:
+                    # Rescore the candidates at full precision; sorted reads keep memory-mapped access sequential
+                    for i, (query, candidate_rows) in enumerate(zip(block, top)):
+                        candidate_rows = np.sort(candidate_rows)
+                        exact_scores = np.asarray(self.embeddings[candidate_rows], dtype=np.float32) @ query
+                        best, best_scores = top_k_rows(exact_scores[np.newaxis], k)
+                        top[i, :k], top_scores[i, :k] = candidate_rows[best[0]], best_scores[0]
+                top, top_scores = top[:, :k], top_scores[:, :k]
+            positions[start:start + len(block)] = top
+            similarities[start:start + len(block)] = top_scores
+        return positions, similarities
+
+    def query(self, query_embeddings, n_results=5, where=None):
+        """
+        Search like collection.query(query_embeddings=..., n_results=..., where=...) and return its result layout.
+        """
+        positions, similarities = self.search(query_embeddings, n_results, where)
+        return {
+            "ids": [[self.ids[i] for i in row] for row in positions],
+            "documents": [[self.documents[i] for i in row] for row in positions],
+            "metadatas": [[self.metadatas[i] for i in row] for row in positions],
+            "distances": (1.0 - similarities).tolist(),
+            "embeddings": None,
+            "uris": None,
+            "data": None,
+            "included": ["metadatas", "documents", "distances"],
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the ChromaDB collection to a memory-mappable NumPy index.")
+    parser.add_argument("path", nargs="?", default=NUMPY_INDEX_PATH or NUMPY_INDEX_DEFAULT_PATH)
+    parser.add_argument("--quantization", choices=["none", "int8", "pq"], default=NUMPY_INDEX_QUANTIZATION)
+    args = parser.parse_args()
+
+    import chromadb
+    from collection_version import read_collection_version
+    from retriever import CHROMA_COLLECTION_NAME, CHROMA_DATA_PATH
+
+    collection = chromadb.PersistentClient(path=CHROMA_DATA_PATH).get_or_create_collection(
+        name=CHROMA_COLLECTION_NAME, embedding_function=None
+    )
+    index = NumpyIndex.open(collection, path=args.path, rebuild=True, quantization=args.quantization,
+                            version=read_collection_version(CHROMA_DATA_PATH, CHROMA_COLLECTION_NAME))
+    print(f"Saved {len(index)} embeddings to {args.path}; "
+          f"{index.memory_bytes / 2**20:,.1f} MiB in memory, {index.mapped_bytes / 2**20:,.1f} MiB memory-mapped "
+          f"({args.quantization})")
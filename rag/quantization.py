@@ -0,0 +1,154 @@
+import numpy as np
+
+QUANTIZE_BLOCK_ROWS = 16384  # Rows decoded per block while scoring, bounds temporary memory
+
+class Int8Quantizer:
+    """
+    Symmetric per-dimension scalar quantisation to int8: 1 byte per dimension (4x smaller
+    than float32). A dot product with a query is the int8 codes times the query scaled
+    by the per-dimension step size.
+    """
+
+    kind = "int8"
+
+    def __init__(self, scales=None):
+        self.scales = scales
+
+    def fit(self, embeddings):
+        # Blockwise, so a memory-mapped matrix is never copied into memory in full
+        peak = np.zeros(embeddings.shape[1], dtype=np.float32)
+        for start in range(0, len(embeddings), QUANTIZE_BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + QUANTIZE_BLOCK_ROWS], dtype=np.float32)
+            np.maximum(peak, np.abs(block).max(axis=0), out=peak)
+        self.scales = np.maximum(peak, 1e-12) / 127.0
+        return self
+
+    def encode(self, embeddings):
+        codes = np.empty(embeddings.shape, dtype=np.int8)
+        for start in range(0, len(embeddings), QUANTIZE_BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + QUANTIZE_BLOCK_ROWS], dtype=np.float32)
+            codes[start:start + len(block)] = np.clip(np.rint(block / self.scales), -127, 127)
+        return codes
+
+    def score(self, codes, queries):
+        """
+        Approximate dot products between queries (n, dim) and every encoded row: (n, rows).
+        """
+        scaled_queries = (queries * self.scales).T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), QUANTIZE_BLOCK_ROWS):
+            block = codes[start:start + QUANTIZE_BLOCK_ROWS]
+            scores[:, start:start + len(block)] = (block.astype(np.float32) @ scaled_queries).T
+        return scores
+
+    @staticmethod
+    def select(codes, rows):
+        """
+        The codes of the given rows only.
+        """
+        return codes[rows]
+
+    def to_arrays(self):
+        return {"scales": self.scales}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(scales=arrays["scales"])
+
+class ProductQuantizer:
+    """
+    Product quantisation: each vector is split into subspaces and every sub-vector is
+    replaced by the id of its nearest of 256 k-means centroids, so a vector costs one
+    byte per subspace. Queries are scored against codes with per-subspace lookup tables.
+    Codes are stored subspace-major, shape (subspaces, rows), so each table lookup reads
+    one contiguous array.
+    """
+
+    kind = "pq"
+
+    def __init__(self, subspaces=48, centroids=None, iterations=15, sample_size=50_000, seed=0):
+        self.subspaces = subspaces
+        self.centroids = centroids  # (subspaces, 256, sub_dim)
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+
+    def fit(self, embeddings):
+        dim = embeddings.shape[1]
+        if dim % self.subspaces:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by {self.subspaces} PQ subspaces")
+        rng = np.random.default_rng(self.seed)
+        sample = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), min(len(embeddings), self.sample_size),
+                                                           replace=False))], dtype=np.float32)
+        sub_dim = dim // self.subspaces
+        n_centroids = min(256, len(sample))
+        self.centroids = np.empty((self.subspaces, n_centroids, sub_dim), dtype=np.float32)
+        for j in range(self.subspaces):
+            self.centroids[j] = self._kmeans(sample[:, j * sub_dim:(j + 1) * sub_dim], n_centroids, rng)
+        return self
+
+    def _kmeans(self, points, k, rng):
+        centroids = points[rng.choice(len(points), k, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = self._nearest(points, centroids)
+            counts = np.bincount(assignment, minlength=k)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, points)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Re-seed empty clusters with random points so every code is used
+            centroids[~filled] = points[rng.choice(len(points), (~filled).sum())]
+        return centroids
+
+    @staticmethod
+    def _nearest(points, centroids):
+        distances = (points ** 2).sum(axis=1, keepdims=True) - 2 * points @ centroids.T + (centroids ** 2).sum(axis=1)
+        return distances.argmin(axis=1)
+
+    def encode(self, embeddings):
+        sub_dim = self.centroids.shape[2]
+        codes = np.empty((self.subspaces, len(embeddings)), dtype=np.uint8)
+        for start in range(0, len(embeddings), QUANTIZE_BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + QUANTIZE_BLOCK_ROWS], dtype=np.float32)
+            for j in range(self.subspaces):
+                codes[j, start:start + len(block)] = self._nearest(block[:, j * sub_dim:(j + 1) * sub_dim],
+                                                                   self.centroids[j])
+        return codes
+
+    def score(self, codes, queries):
+        """
+        Approximate dot products between queries (n, dim) and every encoded row: (n, rows).
+        """
+        sub_dim = self.centroids.shape[2]
+        scores = np.zeros((len(queries), codes.shape[1]), dtype=np.float32)
+        for i, query in enumerate(queries):
+            # Dot product of each query sub-vector with every centroid of its subspace
+            tables = np.einsum("jcd,jd->jc", self.centroids, query.reshape(self.subspaces, sub_dim))
+            for j in range(self.subspaces):
+                scores[i] += np.take(tables[j], codes[j])
+        return scores
+
+    @staticmethod
+    def select(codes, rows):
+        """
+        The codes of the given rows only (kept subspace-major).
+        """
+        return np.ascontiguousarray(codes[:, rows])
+
+    def to_arrays(self):
+        return {"centroids": self.centroids}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        centroids = arrays["centroids"]
+        return cls(subspaces=centroids.shape[0], centroids=centroids)
+
+QUANTIZERS = {quantizer.kind: quantizer for quantizer in (Int8Quantizer, ProductQuantizer)}
+
+def make_quantizer(kind, **options):
+    """
+    Create an untrained quantizer by name ("int8" or "pq").
+    """
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization '{kind}', expected one of {sorted(QUANTIZERS)}")
+    return QUANTIZERS[kind](**options)
@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Query embedding cache configuration
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")  # Optional shared SQLite tier, disabled when empty
+
+def normalize_query(query):
+    """
+    Normalise a query for use as a cache key: Unicode NFKC, case-folded, whitespace collapsed.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of query embeddings keyed by (model, normalised query), with a
+    time-to-live per entry and an optional on-disk tier shared between processes.
+
+    Lookups check memory first, then the disk tier (whose hits are promoted to memory);
+    only queries missing from both are sent to the embedding backend. The disk tier is an
+    EmbeddingCache and is bounded by its LRU eviction rather than the TTL.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+                 disk_path=QUERY_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries = OrderedDict()  # (model, key) -> (expires_at, embedding)
+        self._lock = threading.Lock()
+
+        self.disk = None
+        if disk_path:
+            from embedding_cache import EmbeddingCache
+            self.disk = EmbeddingCache(path=disk_path)
+
+    def _get(self, model, key, now):
+        entry = self._entries.get((model, key))
+        if entry is None:
+            return None
+        expires_at, embedding = entry
+        if expires_at < now:
+            del self._entries[(model, key)]
+            self.expired += 1
+            return None
+        self._entries.move_to_end((model, key))
+        return embedding
+
+    def _put(self, model, key, embedding, now):
+        self._entries[(model, key)] = (now + self.ttl_seconds, embedding)
+        self._entries.move_to_end((model, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, model, queries):
+        """
+        Find cached embeddings in memory, then on disk. Returns (keys, embeddings with None
+        for memory misses, embeddings found on disk by key, {key: query} still to embed).
+        """
+        keys = [normalize_query(query) for query in queries]
+        now = time.time()
+        with self._lock:
+            embeddings = [self._get(model, key, now) for key in keys]
+            self.memory_hits += sum(embedding is not None for embedding in embeddings)
+
+        # Each missing key is looked up and embedded once, even if several queries share it
+        missing = {}
+        for query, key, embedding in zip(queries, keys, embeddings):
+            if embedding is None:
+                missing.setdefault(key, query)
+
+        found = {}
+        if missing and self.disk is not None:
+            disk_keys = list(missing)
+            found = {key: embedding for key, embedding in zip(disk_keys, self.disk.get_many(model, disk_keys))
+                     if embedding is not None}
+
+        to_embed = {key: query for key, query in missing.items() if key not in found}
+        with self._lock:
+            self.disk_hits += len(found)
+            self.misses += len(to_embed)
+        return keys, embeddings, found, to_embed
+
+    def _store(self, model, keys, embeddings, found, to_embed, new_embeddings):
+        if to_embed:
+            found.update(zip(to_embed, new_embeddings))
+            if self.disk is not None:
+                self.disk.put_many(model, list(to_embed), new_embeddings)
+
+        if found:
+            now = time.time()
+            with self._lock:
+                for key, embedding in found.items():
+                    self._put(model, key, embedding, now)
+        return [found[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+
+    def embed(self, model, queries, embed_fn):
+        """
+        Return embeddings for queries, calling embed_fn only for queries that are not cached.
+        """
+        keys, embeddings, found, to_embed = self._lookup(model, queries)
+        new_embeddings = embed_fn(list(to_embed.values())) if to_embed else []
+        return self._store(model, keys, embeddings, found, to_embed, new_embeddings)
+
+    async def aembed(self, model, queries, aembed_fn):
+        """
+        Like embed, but awaits the coroutine function aembed_fn for the queries that are not cached.
+        """
+        keys, embeddings, found, to_embed = self._lookup(model, queries)
+        new_embeddings = await aembed_fn(list(to_embed.values())) if to_embed else []
+        return self._store(model, keys, embeddings, found, to_embed, new_embeddings)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """
+        Hit/miss counters since the cache was created. Misses count queries sent to the embedding backend.
+        """
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
@@ -1,67 +1,26 @@
-import os
-from dotenv import load_dotenv
-import chromadb
-from chromadb import Client
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
-import openai
-from openai import AzureOpenAI
+from retriever import get_retriever
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Azure OpenAI API configuration
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
-
-# Initialize Azure OpenAI client
-azure_openai_client = AzureOpenAI(
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_API_KEY
-)
-
-CHROMA_DATA_PATH = "./chromadb"  # Path to the ChromaDB data directory
-chroma_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
-
-def embed_query_azure(query):
-    """
-    Generate an embedding for a query using Azure OpenAI's API.
-    """
-    try:
-        response = azure_openai_client.embeddings.create(
-            input=query,  # Pass the entire list of texts
-            model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        raise Exception(f"Azure OpenAI API error: {e}")
-
-def query_chromadb(query, top_k=5):
+def query_chromadb(query, top_k=5, where=None):
     """
     Query ChromaDB for the most relevant chunks based on the query.
+    where optionally restricts the search by chunk metadata, either as a ChromaDB where
+    clause or as a filter expression such as 'file_name == "sales.xlsx" and row < 100'.
     """
-    # Generate embedding for the query
-    print("Generating embedding for the query...")
-    query_embedding = embed_query_azure(query)
+    # The retriever keeps the collection and embedding client open across queries
+    retriever = get_retriever()
+    results = retriever.query(query, top_k, where)
+    print(f"Retrieval latency: {retriever.last_timings}")
 
-    # Retrieve the most relevant chunks from ChromaDB
-    print("Querying ChromaDB for relevant chunks...")
-    collection_name = "genie_text_metadata"
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-            api_key=AZURE_OPENAI_API_KEY,
-            model_name=AZURE_OPENAI_DEPLOYMENT_NAME
-        )
-    )
+    return results
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
-    )
+def query_chromadb_many(queries, top_k=5, where=None):
+    """
+    Query ChromaDB for many queries with one embedding request and one vector search.
+    Returns one result per query, in input order.
+    """
+    retriever = get_retriever()
+    results = retriever.query_many(queries, top_k, where)
+    print(f"Retrieval latency: {retriever.last_timings}")
 
     return results
 
@@ -80,5 +39,6 @@ if __name__ == "__main__":
             print(f"\nResult {i + 1}:")
             print(f"Document: {document}")
             print(f"Metadata: {metadata}")
+        print(f"\nRetriever metrics: {get_retriever().metrics()}")
     except Exception as e:
         print(e)
\ No newline at end of file
@@ -1,10 +1,11 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import chromadb
-from chromadb.utils import embedding_functions
 import openai
 from openai import AzureOpenAI
+from retriever import get_retriever
+from answer_cache import get_answer_cache
+from context_packing import pack_context
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +15,7 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
+
 AZURE_OPENAI_CHAT_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
 
 # Initialize Azure OpenAI client
@@ -23,46 +25,13 @@ azure_openai_client = AzureOpenAI(
     api_key=AZURE_OPENAI_API_KEY
 )
 
-# Initialize ChromaDB client
-CHROMA_DATA_PATH = "./chromadb"  # Path to the ChromaDB data directory
-chroma_client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
-
-def embed_query_azure(query):
+def query_chromadb(query, top_k=5, where=None, query_embedding=None):
     """
-    Generate an embedding for a query using Azure OpenAI's API.
+    Query ChromaDB for the most relevant chunks based on the query, optionally restricted
+    by a metadata filter (a where clause or a filter expression).
     """
-    try:
-        response = azure_openai_client.embeddings.create(
-            input=query,  # Pass the entire list of texts
-            model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        raise Exception(f"Azure OpenAI API error: {e}")
-
-def query_chromadb(query, top_k=5):
-    """
-    Query ChromaDB for the most relevant chunks based on the query.
-    """
-    # Generate embedding for the query
-    query_embedding = embed_query_azure(query)
-
-    # Retrieve the most relevant chunks from ChromaDB
-    collection_name = "genie_text_metadata"
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        embedding_function=embedding_functions.OpenAIEmbeddingFunction(
-            api_key=AZURE_OPENAI_API_KEY,
-            model_name=AZURE_OPENAI_DEPLOYMENT_NAME
-        )
-    )
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k
-    )
-
-    return results
+    # The retriever lives in an imported module, so it stays open across Streamlit reruns
+    return get_retriever().query(query, top_k, where, query_embedding)
 
 def summarize_results(query, documents):
     """
@@ -92,10 +61,42 @@ def summarize_results(query, documents):
     except Exception as e:
         raise Exception(f"Azure OpenAI GPT summarization error: {e}")
 
+def answer_query(query, top_k=5, where=None):
+    """
+    Retrieve chunks for the query and summarize them, reusing a cached answer when a
+    semantically similar query was answered from the same chunks.
+    Returns (results, summary, cached, packing), where packing holds the context packing
+    stats (None for a cached answer).
+    """
+    retriever = get_retriever()
+    answer_cache = get_answer_cache()
+    answer_cache.check_collection(retriever.collection.count())  # New or removed chunks invalidate answers
+
+    # Embedded once: the answer cache and the search share the embedding
+    query_embedding = retriever.embed_query(query)
+    results = query_chromadb(query, top_k, where, query_embedding)
+    chunk_ids = results['ids'][0]
+
+    summary = answer_cache.get(query_embedding, chunk_ids)
+    if summary is not None:
+        return results, summary, True, None
+
+    # Merge, deduplicate and trim the documents to the context token budget
+    documents, packing = pack_context(results['documents'][0], results['metadatas'][0])
+    print(f"Context packing: {packing}")
+
+    # Summarize the results
+    summary = summarize_results(query, documents)
+    answer_cache.put(query_embedding, chunk_ids, summary)
+    return results, summary, False, packing
+
 # Streamlit App
 st.title("Conversational RAG App")
 st.write("Ask a question, and the app will retrieve relevant information from ChromaDB and summarize it for you.")
 
+# Optional metadata filter applied to every query, e.g. file_name == "sales.xlsx" and row < 100
+filters = st.sidebar.text_input("Filter chunks by metadata:", help='e.g. file_name == "sales.xlsx" and row < 100')
+
 # Initialize session state for conversation
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -114,14 +115,8 @@ if user_query := st.chat_input("Enter your query:"):
 
     # Process the query
     try:
-        # Query ChromaDB
-        results = query_chromadb(user_query)
-
-        # Extract documents for summarization
-        documents = "\n".join(results['documents'][0])
-
-        # Summarize the results
-        summary = summarize_results(user_query, documents)
+        # Query ChromaDB and summarize, or reuse the answer to a near-identical question
+        results, summary, cached, packing = answer_query(user_query, where=filters)
 
         # Add assistant message to conversation
         with st.chat_message("assistant"):
@@ -129,6 +124,10 @@ if user_query := st.chat_input("Enter your query:"):
         st.session_state.messages.append({"role": "assistant", "content": summary})
 
         # Display retrieved chunks
+        st.caption(f"Retrieval latency: {get_retriever().last_timings}")
+        st.caption(f"{'Cached answer' if cached else 'New answer'}; answer cache: {get_answer_cache().stats}")
+        if packing is not None:
+            st.caption(f"Context: {packing['tokens_after']} tokens ({packing['tokens_saved']} saved by packing); {packing}")
         st.write("### Retrieved Chunks:")
         for i, (document, metadata) in enumerate(zip(results['documents'][0], results['metadatas'][0])):
             st.write(f"**Result {i + 1}:**")
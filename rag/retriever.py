@@ -0,0 +1,424 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from collection_version import read_collection_version
+from metadata_filter import parse_filter
+from numpy_index import normalize_rows
+from query_cache import QueryEmbeddingCache
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Azure OpenAI API configuration
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
+
+# "azure" or "local" (offline ONNX model); must match the backend used at ingest time
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "azure")
+
+CHROMA_DATA_PATH = os.getenv("CHROMA_DATA_PATH", "./chromadb")  # Path to the ChromaDB data directory
+CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "genie_text_metadata")
+RETRIEVER_METRICS_WINDOW = int(os.getenv("RETRIEVER_METRICS_WINDOW", "1000"))  # Recent calls kept for percentiles
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "chroma")  # "chroma" or "numpy" (exact in-memory search)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")  # "dense" or "hybrid" (BM25 + vector, fused with RRF)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))  # Each ranking returns top_k * this for fusion
+EMBEDDING_MAX_BATCH_ITEMS = int(os.getenv("EMBEDDING_MAX_BATCH_ITEMS", "2048"))  # Azure OpenAI inputs per request
+EMBEDDING_REQUEST_TIMEOUT = float(os.getenv("EMBEDDING_REQUEST_TIMEOUT", "20"))  # Seconds per embedding request
+NUMPY_INDEX_RELOAD_SECONDS = float(os.getenv("NUMPY_INDEX_RELOAD_SECONDS", "30"))  # How often the numpy engine checks for collection changes
+
+def collection_space(collection):
+    """
+    The distance function of a ChromaDB collection: "l2" (the default), "ip" or "cosine".
+    """
+    configuration = getattr(collection, "configuration_json", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space")
+    return space or (collection.metadata or {}).get("hnsw:space", "l2")
+
+class Retriever:
+    """
+    Long-lived retrieval handle: opens the ChromaDB collection and the embedding client
+    once and reuses them for every query, recording per-query latency for each step.
+
+    Queries are always embedded here and sent as query_embeddings, so the collection is
+    opened without an embedding function. With the "numpy" engine, searches run against an
+    in-memory NumpyIndex snapshot of the collection instead of ChromaDB, rebuilt when the
+    collection changes (see check_index). Either engine reports cosine distances
+    (1 - similarity).
+    In "hybrid" mode a BM25 search over the LexicalIndex runs in parallel with embedding and
+    vector search, and the two rankings are fused with reciprocal rank fusion.
+
+    Queries can be scoped with a metadata filter (a where clause or a filter expression such
+    as 'file_name == "sales.xlsx" and row < 100'), which is pushed down into the search.
+
+    The a-prefixed methods (aquery, aquery_many, aretrieve) are for event loops: embedding
+    goes through the async Azure OpenAI client and the blocking search runs in a worker
+    thread, so a slow call never stalls other requests on the loop.
+    """
+
+    def __init__(self, chroma_path=CHROMA_DATA_PATH, collection_name=CHROMA_COLLECTION_NAME,
+                 backend=EMBEDDING_BACKEND, metrics_window=RETRIEVER_METRICS_WINDOW, query_cache=None,
+                 engine=RETRIEVAL_ENGINE, mode=RETRIEVAL_MODE, embedder=None, lexical_index=None, index_path=None):
+        self.backend = backend
+        self.engine = engine
+        self.mode = mode
+        self.chroma_path = chroma_path
+        self.collection_name = collection_name
+        self.open_collection()
+        self.space = collection_space(self.collection)
+
+        self.index = None
+        if engine == "numpy":
+            from numpy_index import NUMPY_INDEX_PATH, NumpyIndex
+            self.index_path = index_path if index_path is not None else NUMPY_INDEX_PATH
+            self.index = NumpyIndex.open(self.collection, path=self.index_path, version=self.collection_version())
+            self._index_lock = threading.Lock()
+            self._index_checked = float("-inf")
+            self.check_index()  # A saved index may predate the last ingestion run
+
+        self.lexical_index = None
+        if mode == "hybrid":
+            from lexical_index import LEXICAL_INDEX_PATH, LexicalIndex
+            self.lexical_index = lexical_index if lexical_index is not None else LexicalIndex(LEXICAL_INDEX_PATH)
+            self._lexical_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retriever-bm25")
+
+        self.embedder = embedder  # Optional callable(list of texts) -> embeddings, overrides the backend
+        self.async_azure_openai_client = None
+        if embedder is not None:
+            self.local_embedder = None
+            self.azure_openai_client = None
+            self.embedding_model = getattr(embedder, "MODEL_NAME", "custom")
+        elif backend == "local":
+            from local_embeddings import LocalEmbedder, get_local_embedder
+            self.local_embedder = get_local_embedder()  # Loads the model now rather than on the first query
+            self.azure_openai_client = None
+            self.embedding_model = LocalEmbedder.MODEL_NAME
+        else:
+            self.local_embedder = None
+            self.embedding_model = AZURE_OPENAI_DEPLOYMENT_NAME
+            self.azure_openai_client = AzureOpenAI(
+                api_version=AZURE_OPENAI_API_VERSION,
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                timeout=EMBEDDING_REQUEST_TIMEOUT
+            )
+            self.async_azure_openai_client = AsyncAzureOpenAI(
+                api_version=AZURE_OPENAI_API_VERSION,
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                timeout=EMBEDDING_REQUEST_TIMEOUT
+            )
+
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache()
+        self.latencies = deque(maxlen=metrics_window)  # (embed_ms, search_ms, total_ms) per call
+        self.queries = 0
+        self.last_timings = None
+
+    def embed_query(self, query):
+        """
+        Generate an embedding for a query with the configured embedding backend.
+        """
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries):
+        """
+        Generate embeddings for a list of queries, reusing cached embeddings of repeat queries.
+        """
+        return self.query_cache.embed(self.embedding_model, list(queries), self.embed_queries_uncached)
+
+    def embed_queries_uncached(self, queries):
+        """
+        Generate embeddings for a list of queries in as few backend calls as possible.
+        """
+        if self.embedder is not None:
+            return [list(map(float, embedding)) for embedding in self.embedder(queries)]
+        if self.local_embedder is not None:
+            return self.local_embedder.embed(queries).tolist()
+        try:
+            embeddings = []
+            for i in range(0, len(queries), EMBEDDING_MAX_BATCH_ITEMS):
+                response = self.azure_openai_client.embeddings.create(
+                    input=queries[i:i + EMBEDDING_MAX_BATCH_ITEMS],  # One request for the whole batch
+                    model=AZURE_OPENAI_DEPLOYMENT_NAME  # Use the deployment name as the engine
+                )
+                embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+            return embeddings
+        except Exception as e:
+            raise Exception(f"Azure OpenAI API error: {e}")
+
+    async def aembed_queries(self, queries):
+        """
+        Async embed_queries: cached embeddings are reused and the rest are embedded without blocking the loop.
+        """
+        return await self.query_cache.aembed(self.embedding_model, list(queries), self.aembed_queries_uncached)
+
+    async def aembed_queries_uncached(self, queries):
+        """
+        Generate embeddings with the async Azure OpenAI client, one request per batch, all in
+        flight at once. Custom and local embedders run in a worker thread.
+        """
+        if self.async_azure_openai_client is None:
+            return await asyncio.to_thread(self.embed_queries_uncached, queries)
+        try:
+            responses = await asyncio.gather(*(
+                self.async_azure_openai_client.embeddings.create(
+                    input=queries[i:i + EMBEDDING_MAX_BATCH_ITEMS],
+                    model=AZURE_OPENAI_DEPLOYMENT_NAME
+                )
+                for i in range(0, len(queries), EMBEDDING_MAX_BATCH_ITEMS)
+            ))
+            return [item.embedding for response in responses
+                    for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            raise Exception(f"Azure OpenAI API error: {e}")
+
+    def record(self, embed_seconds, search_seconds, n_queries=1):
+        """
+        Record one call's step latencies in milliseconds.
+        """
+        timings = {
+            "embed_ms": round(embed_seconds * 1000, 2),
+            "search_ms": round(search_seconds * 1000, 2),
+            "total_ms": round((embed_seconds + search_seconds) * 1000, 2),
+            "queries": n_queries,
+        }
+        self.latencies.append((timings["embed_ms"], timings["search_ms"], timings["total_ms"]))
+        self.queries += n_queries
+        self.last_timings = timings
+        return timings
+
+    def search(self, query_embeddings, top_k=5, where=None):
+        """
+        Find the top_k chunks for each query embedding with the configured engine, among
+        the chunks matching the where clause if one is given.
+        """
+        if self.index is not None:
+            self.check_index()
+            return self.index.query(query_embeddings, n_results=top_k, where=where)
+
+        # Unit-length queries make Chroma's l2 distance 2 - 2 * cosine similarity for the
+        # (unit-length) stored embeddings, and change no ranking in any space
+        query_embeddings = normalize_rows(np.asarray(query_embeddings, dtype=np.float32)).tolist()
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where
+        )
+        if self.space == "l2" and results.get("distances") is not None:
+            results["distances"] = [[distance / 2 for distance in row] for row in results["distances"]]
+        return results
+
+    def open_collection(self, reopen=False):
+        """
+        Open the ChromaDB client and collection. Chroma keeps one store handle per path and
+        process, and that handle does not see vectors written by other processes since it
+        was opened; reopen drops it so the collection is read afresh.
+        """
+        if reopen:
+            SharedSystemClient.clear_system_cache()
+        self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+        self.collection = self.chroma_client.get_or_create_collection(name=self.collection_name,
+                                                                      embedding_function=None)
+
+    def reload_index(self):
+        """
+        Rebuild the in-memory index from the collection, e.g. after an ingestion run.
+        """
+        if self.engine == "numpy":
+            from numpy_index import NumpyIndex
+            self.open_collection(reopen=True)  # The ingestion may have run in another process
+            self.index = NumpyIndex.open(self.collection, path=self.index_path, rebuild=True,
+                                         version=self.collection_version())
+
+    def collection_version(self):
+        """
+        The collection's change marker, replaced by every upsert, delete and reset made
+        through the ingest helpers (see collection_version).
+        """
+        return read_collection_version(self.chroma_path, self.collection.name)
+
+    def check_index(self):
+        """
+        Reload the numpy index if the collection has changed since it was built: its change
+        marker differs from the one the index was built at, or (for writes that bypass the
+        ingest helpers) the number of records differs. Checked at most every
+        NUMPY_INDEX_RELOAD_SECONDS; searches keep using the old index until the new one is ready.
+        """
+        if self.index is None or time.monotonic() - self._index_checked < NUMPY_INDEX_RELOAD_SECONDS:
+            return
+        if not self._index_lock.acquire(blocking=False):
+            return  # Another search is already checking or rebuilding
+        try:
+            if self.collection_version() != self.index.version or self.collection.count() != len(self.index):
+                self.reload_index()
+            self._index_checked = time.monotonic()
+        finally:
+            self._index_lock.release()
+
+    def fuse(self, dense_results, lexical_results, top_k=5, where=None):
+        """
+        Fuse per-query dense results and BM25 (chunk_id, score) lists with reciprocal rank
+        fusion. Returns a batched result in collection.query layout with "scores" (the RRF
+        scores) in place of distances.
+        """
+        from lexical_index import reciprocal_rank_fusion
+
+        records = {}
+        for ids, documents, metadatas in zip(dense_results["ids"], dense_results["documents"],
+                                             dense_results["metadatas"]):
+            records.update(zip(ids, zip(documents, metadatas)))
+
+        if where:
+            # The BM25 index holds no metadata, so its candidates are checked against the filter before fusion
+            candidates = list({chunk_id for lexical in lexical_results for chunk_id, _ in lexical
+                               if chunk_id not in records})
+            matching = set(self.collection.get(ids=candidates, where=where, include=[])["ids"]) if candidates else set()
+            lexical_results = [
+                [(chunk_id, score) for chunk_id, score in lexical if chunk_id in records or chunk_id in matching]
+                for lexical in lexical_results
+            ]
+        fused = [
+            reciprocal_rank_fusion([dense_ids, [chunk_id for chunk_id, _ in lexical]], top_k)
+            for dense_ids, lexical in zip(dense_results["ids"], lexical_results)
+        ]
+
+        # Chunks found only by BM25 are fetched by id
+        missing = list({chunk_id for ranking in fused for chunk_id, _ in ranking if chunk_id not in records})
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            records.update(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+        # Drop ids the lexical index still has but the collection no longer does
+        fused = [[(chunk_id, score) for chunk_id, score in ranking if chunk_id in records] for ranking in fused]
+
+        return {
+            "ids": [[chunk_id for chunk_id, _ in ranking] for ranking in fused],
+            "documents": [[records[chunk_id][0] for chunk_id, _ in ranking] for ranking in fused],
+            "metadatas": [[records[chunk_id][1] for chunk_id, _ in ranking] for ranking in fused],
+            "scores": [[score for _, score in ranking] for ranking in fused],
+            "distances": None,
+            "embeddings": None,
+            "uris": None,
+            "data": None,
+            "included": ["metadatas", "documents"],
+        }
+
+    def retrieve(self, queries, top_k=5, where=None, query_embeddings=None):
+        """
+        Embed and search a list of queries, returning one batched result in collection.query layout.
+        where is an optional metadata filter (a where clause or a filter expression). Callers
+        that already embedded the queries pass query_embeddings to skip that step.
+        """
+        where = parse_filter(where)
+        start = time.perf_counter()
+        candidates = top_k * HYBRID_CANDIDATES if self.lexical_index is not None else top_k
+        lexical_future = None
+        if self.lexical_index is not None:
+            # BM25 needs no embedding, so it overlaps with both the embedding call and the vector search
+            lexical_future = self._lexical_pool.submit(self.lexical_index.search_many, queries, candidates)
+
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+        embedded = time.perf_counter()
+        results = self.search(query_embeddings, candidates, where)
+        if lexical_future is not None:
+            results = self.fuse(results, lexical_future.result(), top_k, where)
+        self.record(embedded - start, time.perf_counter() - embedded, len(queries))
+        return results
+
+    async def aretrieve(self, queries, top_k=5, where=None):
+        """
+        Async retrieve: the same steps and result, with the blocking steps moved off the event loop.
+        """
+        where = parse_filter(where)
+        start = time.perf_counter()
+        candidates = top_k * HYBRID_CANDIDATES if self.lexical_index is not None else top_k
+        lexical_future = None
+        if self.lexical_index is not None:
+            lexical_future = asyncio.wrap_future(
+                self._lexical_pool.submit(self.lexical_index.search_many, queries, candidates)
+            )
+
+        query_embeddings = await self.aembed_queries(queries)
+        embedded = time.perf_counter()
+        results = await asyncio.to_thread(self.search, query_embeddings, candidates, where)
+        if lexical_future is not None:
+            results = await asyncio.to_thread(self.fuse, results, await lexical_future, top_k, where)
+        self.record(embedded - start, time.perf_counter() - embedded, len(queries))
+        return results
+
+    async def aquery(self, query, top_k=5, where=None):
+        """
+        Async query: the most relevant chunks for one query.
+        """
+        return await self.aretrieve([query], top_k, where)
+
+    async def aquery_many(self, queries, top_k=5, where=None):
+        """
+        Async query_many: one result per query, in input order.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        return split_results(await self.aretrieve(queries, top_k, where), len(queries))
+
+    def query(self, query, top_k=5, where=None, query_embedding=None):
+        """
+        Query ChromaDB for the most relevant chunks based on the query (or its embedding, if given).
+        """
+        return self.retrieve([query], top_k, where, None if query_embedding is None else [query_embedding])
+
+    def query_many(self, queries, top_k=5, where=None):
+        """
+        Query ChromaDB for many queries at once: one batched embedding request and one
+        vector search call. Returns one result per query, in input order, each shaped
+        like the result of query().
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        return split_results(self.retrieve(queries, top_k, where), len(queries))
+
+    def metrics(self):
+        """
+        Latency percentiles (ms) per step over the recent window of calls.
+        """
+        metrics = {"queries": self.queries, "window": len(self.latencies), "query_cache": self.query_cache.stats}
+        if self.latencies:
+            latencies = np.array(self.latencies)
+            for i, step in enumerate(("embed", "search", "total")):
+                p50, p95, p99 = np.percentile(latencies[:, i], [50, 95, 99])
+                metrics[step] = {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+        return metrics
+
+def split_results(results, n_queries):
+    """
+    Split a batched collection.query result into one single-query result per query.
+    """
+    return [
+        {key: value if key == "included" or value is None else [value[i]] for key, value in results.items()}
+        for i in range(n_queries)
+    ]
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever():
+    """
+    Return the process-wide Retriever, opening the collection and clients on first use.
+    """
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = Retriever()
+        return _retriever
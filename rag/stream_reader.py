@@ -0,0 +1,105 @@
+import os
+import time
+from itertools import islice
+
+import pandas as pd
+
+# Number of rows held in memory per batch
+READ_BATCH_ROWS = int(os.getenv("READ_BATCH_ROWS", "10000"))
+
+def _iter_excel_batches(file_name, batch_size, sheet_name=None):
+    """
+    Yield DataFrames of at most batch_size rows from an Excel sheet using openpyxl's read-only mode.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(column) if column is not None else f"column_{i}" for i, column in enumerate(header)]
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+def iter_row_batches(file_name, batch_size=READ_BATCH_ROWS, columns=None, sheet_name=None, max_rows=None):
+    """
+    Stream a large Excel, CSV or Parquet file as DataFrames of at most batch_size rows.
+    Each DataFrame is indexed by the row's position in the source file, so memory use stays
+    bounded by the batch size no matter how big the file is.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f"The file '{file_name}' was not found in the current folder.")
+
+    if extension == ".csv":
+        batches = pd.read_csv(file_name, chunksize=batch_size, usecols=columns)
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_name)
+        batches = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns))
+    elif extension in (".xlsx", ".xlsm"):
+        batches = _iter_excel_batches(file_name, batch_size, sheet_name)
+    else:
+        raise ValueError(f"Unsupported file type '{extension}' for '{file_name}'.")
+
+    row_offset = 0
+    for batch in batches:
+        if columns is not None:
+            batch = batch[columns]
+        if max_rows is not None:
+            batch = batch.head(max_rows - row_offset)
+        batch.index = pd.RangeIndex(row_offset, row_offset + len(batch))
+        row_offset += len(batch)
+        if len(batch):
+            yield batch
+        if max_rows is not None and row_offset >= max_rows:
+            break
+
+def existing_columns(file_name, columns, sheet_name=None):
+    """
+    Keep the columns the file actually has (reading only its header), in the given order.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".csv":
+        header = pd.read_csv(file_name, nrows=0).columns
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        header = pq.read_schema(file_name).names
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_name, read_only=True)
+        try:
+            worksheet = workbook[sheet_name] if sheet_name else workbook.active
+            header = [str(column) for column in next(worksheet.iter_rows(max_row=1, values_only=True), ())
+                      if column is not None]
+        finally:
+            workbook.close()
+    header = set(header)
+    return [column for column in columns if column in header]
+
+def source_metadata(file_name, sheet_name=None):
+    """
+    Filterable metadata describing where a file's rows come from: the file name, the sheet
+    (Excel only) and when it was ingested (Unix seconds).
+    """
+    metadata = {"file_name": os.path.basename(file_name), "ingested_at": int(time.time())}
+    if os.path.splitext(file_name)[1].lower() in (".xlsx", ".xlsm"):
+        if sheet_name is None:
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(file_name, read_only=True)
+            sheet_name = workbook.active.title
+            workbook.close()
+        metadata["sheet"] = sheet_name
+    return metadata